@@ -0,0 +1,76 @@
+"""Compara el acceso síncrono y asíncrono a la base de datos bajo concurrencia.
+
+El modo síncrono reproduce lo que hace FastAPI con los endpoints ``def``: cada
+consulta ocupa un hilo del threadpool (40 por defecto) durante todo el viaje a la
+base de datos. El modo asíncrono ejecuta las mismas consultas sobre ``async_engine``
+desde un único hilo.
+
+Uso, desde la carpeta ``back``::
+
+    python -m bench.db_modes --requests 5000 --concurrency 1000
+"""
+
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from bench.seed import seed_dataset
+from bench.stats import format_summary, summarize
+from models import Task, async_engine, engine
+
+
+def statement(user_id: int):
+    return select(Task).where(Task.user_id == user_id).order_by(Task.id).limit(100)
+
+
+def run_sync(user_id: int, requests: int, threads: int) -> list[float]:
+    def query(_):
+        start = time.perf_counter()
+        with Session(engine) as session:
+            session.exec(statement(user_id)).all()
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(query, range(requests)))
+
+
+async def run_async(user_id: int, requests: int, concurrency: int) -> list[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def query():
+        async with semaphore:
+            start = time.perf_counter()
+            async with AsyncSession(async_engine) as session:
+                (await session.exec(statement(user_id))).all()
+            return time.perf_counter() - start
+
+    return await asyncio.gather(*(query() for _ in range(requests)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument(
+        "--threads", type=int, default=40, help="Hilos del modo síncrono"
+    )
+    parser.add_argument("--tasks", type=int, default=1000)
+    args = parser.parse_args()
+
+    (user_id,) = seed_dataset(users=1, tasks=args.tasks, categories=1)
+
+    start = time.perf_counter()
+    latencies = run_sync(user_id, args.requests, args.threads)
+    print(format_summary("sync", summarize(latencies, time.perf_counter() - start)))
+
+    start = time.perf_counter()
+    latencies = asyncio.run(run_async(user_id, args.requests, args.concurrency))
+    print(format_summary("async", summarize(latencies, time.perf_counter() - start)))
+
+
+if __name__ == "__main__":
+    main()
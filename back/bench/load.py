@@ -0,0 +1,218 @@
+"""Prueba de carga reproducible de los endpoints principales del backend.
+
+Genera el conjunto de datos con ``bench.seed`` en la base de datos configurada en
+``DATABASE_CONNECTION`` y ejecuta cada escenario contra un backend en ejecución
+que use esa misma base de datos. Para cada escenario reporta el throughput y las
+latencias p50/p95/p99.
+
+Con ``--save`` el resultado se guarda como línea base en JSON; con ``--compare``
+se compara contra una línea base y el proceso termina con código 1 si alguna
+métrica empeora más que ``--threshold``.
+
+Uso, desde la carpeta ``back``::
+
+    python -m bench.load --url http://localhost:8080 --save bench/baseline.json
+    python -m bench.load --url http://localhost:8080 --compare bench/baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from datetime import date, timedelta
+
+import httpx
+
+from bench.seed import PASSWORD, WORDS, seed_dataset, username
+from bench.stats import format_summary, summarize
+
+SCENARIOS = [
+    "create_user",
+    "start_session",
+    "get_tasks",
+    "search_tasks",
+    "create_task",
+    "update_task",
+    "get_category",
+]
+LOWER_IS_WORSE = ("throughput",)
+HIGHER_IS_WORSE = ("p50", "p95", "p99")
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, users: int, seed: int):
+        self.client = client
+        self.users = users
+        self.rng = random.Random(seed)
+        self.tokens: list[dict] = []
+        self.task_ids: list[list[int]] = []
+        self.category_ids: list[int] = []
+
+    async def setup(self):
+        for n in range(self.users):
+            r = await self.client.post(
+                "/usuarios/iniciar-sesion",
+                data={"username": username(n), "password": PASSWORD},
+            )
+            r.raise_for_status()
+            headers = {"Authorization": "Bearer " + r.json()["access_token"]}
+            r = await self.client.get(
+                "/tareas", params={"limite": 1000}, headers=headers
+            )
+            r.raise_for_status()
+            self.tokens.append(headers)
+            self.task_ids.append([task["id"] for task in r.json()])
+        r = await self.client.get("/categorias")
+        r.raise_for_status()
+        self.category_ids = [category["id"] for category in r.json()]
+
+    def user(self) -> int:
+        return self.rng.randrange(self.users)
+
+    def create_user(self):
+        return self.client.post(
+            "/usuarios",
+            json={"username": f"bench_{uuid.uuid4().hex}", "password": PASSWORD},
+        )
+
+    def start_session(self):
+        return self.client.post(
+            "/usuarios/iniciar-sesion",
+            data={"username": username(self.user()), "password": PASSWORD},
+        )
+
+    def get_tasks(self):
+        return self.client.get("/tareas", headers=self.tokens[self.user()])
+
+    def search_tasks(self):
+        return self.client.get(
+            "/tareas/buscar",
+            params={"q": self.rng.choice(WORDS)[:4]},
+            headers=self.tokens[self.user()],
+        )
+
+    def create_task(self):
+        return self.client.post(
+            "/tareas",
+            json={
+                "text": "Tarea de carga",
+                "end_planned_date": str(date.today() + timedelta(days=7)),
+                "state": 1,
+                "category_id": self.rng.choice(self.category_ids),
+            },
+            headers=self.tokens[self.user()],
+        )
+
+    def update_task(self):
+        n = self.user()
+        return self.client.put(
+            f"/tareas/{self.rng.choice(self.task_ids[n])}",
+            json={"text": f"Actualizada {self.rng.random()}"},
+            headers=self.tokens[n],
+        )
+
+    def get_category(self):
+        return self.client.get("/categorias")
+
+    async def run(self, scenario: str, requests: int, concurrency: int) -> dict:
+        request = getattr(self, scenario)
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        errors = 0
+
+        async def one():
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    r = await request()
+                except httpx.HTTPError:
+                    errors += 1
+                    return
+                if r.status_code >= 400:
+                    errors += 1
+                else:
+                    latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        return summarize(latencies, time.perf_counter() - start, errors)
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Devuelve las métricas que empeoraron más que ``threshold`` respecto a la base"""
+    regressions = []
+    for scenario, summary in results["scenarios"].items():
+        base = baseline["scenarios"].get(scenario)
+        if base is None:
+            continue
+        for metric in LOWER_IS_WORSE + HIGHER_IS_WORSE:
+            if metric not in summary or not base.get(metric):
+                continue
+            change = (summary[metric] - base[metric]) / base[metric]
+            worse = -change if metric in LOWER_IS_WORSE else change
+            if worse > threshold:
+                regressions.append(
+                    f"{scenario}.{metric}: {base[metric]:.1f} -> {summary[metric]:.1f}"
+                    f" ({change:+.0%})"
+                )
+    return regressions
+
+
+async def run(args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=args.url, limits=limits, timeout=args.timeout
+    ) as client:
+        load_test = LoadTest(client, args.users, args.seed)
+        await load_test.setup()
+        scenarios = {}
+        for scenario in args.scenarios:
+            scenarios[scenario] = await load_test.run(
+                scenario, args.requests, args.concurrency
+            )
+            print(format_summary(scenario, scenarios[scenario]))
+    return {"config": vars(args), "scenarios": scenarios}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--tasks", type=int, default=1000)
+    parser.add_argument("--categories", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--save", help="Guarda el resultado como línea base")
+    parser.add_argument("--compare", help="Línea base con la que comparar")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Empeoramiento relativo permitido antes de fallar",
+    )
+    args = parser.parse_args()
+
+    seed_dataset(args.users, args.tasks, args.categories, args.seed)
+    results = asyncio.run(run(args))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"Regresión: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Mide el rendimiento de inicio de sesión bajo carga concurrente.
+
+Lanza ``--requests`` inicios de sesión con ``--concurrency`` clientes simultáneos
+contra un backend en ejecución y, en paralelo, consulta ``GET /categorias`` para
+medir cuánto afecta el hashing de contraseñas al resto de endpoints. Las
+respuestas 503 indican que el pool de hashing rechazó la petición.
+
+Uso, desde la carpeta ``back``::
+
+    python -m bench.login --url http://localhost:8080 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+import httpx
+
+from bench.stats import format_summary, summarize
+
+BENCH_USERNAME = "bench_login"
+BENCH_PASSWORD = "bench_password"
+
+
+async def run(url: str, requests: int, concurrency: int):
+    limits = httpx.Limits(max_connections=concurrency + 1)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        await client.post(
+            "/usuarios", json={"username": BENCH_USERNAME, "password": BENCH_PASSWORD}
+        )
+
+        semaphore = asyncio.Semaphore(concurrency)
+        statuses = Counter()
+        login_latencies = []
+        probe_latencies = []
+        done = asyncio.Event()
+
+        async def login():
+            async with semaphore:
+                start = time.perf_counter()
+                r = await client.post(
+                    "/usuarios/iniciar-sesion",
+                    data={"username": BENCH_USERNAME, "password": BENCH_PASSWORD},
+                )
+                statuses[r.status_code] += 1
+                if r.status_code == 200:
+                    login_latencies.append(time.perf_counter() - start)
+
+        async def probe():
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/categorias")
+                probe_latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.05)
+
+        probe_task = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe_task
+
+    errors = sum(statuses.values()) - statuses[200]
+    print(format_summary("logins", summarize(login_latencies, elapsed, errors)))
+    print(f"estados: {dict(statuses)}")
+    print(format_summary("GET /categorias", summarize(probe_latencies, elapsed)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Genera un conjunto de datos sintético y reproducible para los benchmarks.
+
+Crea ``users`` usuarios (``bench_user_<n>``, contraseña ``bench_password``),
+``categories`` categorías y ``tasks`` tareas por usuario a través de los modelos
+del backend. Los usuarios que ya existen se reutilizan sin modificar sus tareas.
+
+Uso, desde la carpeta ``back``::
+
+    python -m bench.seed --users 10 --tasks 1000 --categories 5
+"""
+
+import argparse
+import asyncio
+import random
+from datetime import date, datetime, timedelta
+
+import bcrypt
+from sqlalchemy import insert
+from sqlmodel import Session, select
+
+from conf import BCRYPT_ROUNDS
+from migrations import init_db
+from models import Category, State, Task, User, async_engine, engine
+from summary import rebuild_summary
+
+USERNAME_PREFIX = "bench_user_"
+PASSWORD = "bench_password"
+INSERT_BATCH_SIZE = 10_000
+WORDS = [
+    "comprar",
+    "llamar",
+    "pagar",
+    "revisar",
+    "enviar",
+    "preparar",
+    "limpiar",
+    "leche",
+    "médico",
+    "factura",
+    "correo",
+    "informe",
+    "reunión",
+    "casa",
+    "auto",
+]
+
+
+def username(n: int) -> str:
+    return f"{USERNAME_PREFIX}{n}"
+
+
+def ensure_categories(session: Session, categories: int) -> list[int]:
+    names = [f"bench-{n}" for n in range(categories)]
+    existing = set(
+        session.exec(select(Category.name).where(Category.name.in_(names))).all()
+    )
+    session.add_all(Category(name=name) for name in names if name not in existing)
+    session.commit()
+    return list(session.exec(select(Category.id).where(Category.name.in_(names))).all())
+
+
+async def _init_db():
+    await init_db()
+    await async_engine.dispose()
+
+
+async def _rebuild_summary(user_ids: list[int]):
+    async with async_engine.begin() as connection:
+        for user_id in user_ids:
+            await rebuild_summary(connection, user_id)
+    await async_engine.dispose()
+
+
+def seed_dataset(users: int, tasks: int, categories: int, seed: int = 0) -> list[int]:
+    """Crea el conjunto de datos y devuelve los ids de los usuarios en orden"""
+    asyncio.run(_init_db())
+    rng = random.Random(seed)
+    names = [username(n) for n in range(users)]
+    with Session(engine) as session:
+        category_ids = ensure_categories(session, categories)
+
+        existing = set(
+            session.exec(select(User.username).where(User.username.in_(names))).all()
+        )
+        password = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(BCRYPT_ROUNDS))
+        new_users = [
+            User(username=name, password=password.decode())
+            for name in names
+            if name not in existing
+        ]
+        session.add_all(new_users)
+        session.commit()
+
+        today = date.today()
+        now = datetime.now()
+        rows = []
+        for user in new_users:
+            for n in range(tasks):
+                rows.append(
+                    {
+                        "text": " ".join(rng.sample(WORDS, 3)) + f" {n}",
+                        "creation_date": now,
+                        "end_planned_date": today
+                        + timedelta(days=rng.randint(-30, 90)),
+                        "state": rng.choice(list(State)),
+                        "category_id": rng.choice(category_ids),
+                        "user_id": user.id,
+                    }
+                )
+                if len(rows) >= INSERT_BATCH_SIZE:
+                    session.exec(insert(Task.__table__), params=rows)
+                    rows = []
+        if rows:
+            session.exec(insert(Task.__table__), params=rows)
+        session.commit()
+        new_ids = [user.id for user in new_users]
+
+        ids = dict(
+            session.exec(
+                select(User.username, User.id).where(User.username.in_(names))
+            ).all()
+        )
+    if new_ids:
+        asyncio.run(_rebuild_summary(new_ids))
+    return [ids[name] for name in names]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--tasks", type=int, default=1000)
+    parser.add_argument("--categories", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    user_ids = seed_dataset(args.users, args.tasks, args.categories, args.seed)
+    print(f"{len(user_ids)} usuarios listos")
+
+
+if __name__ == "__main__":
+    main()
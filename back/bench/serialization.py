@@ -0,0 +1,101 @@
+"""Compara la serialización de un listado de tareas con y sin ``response_model``.
+
+El modo ``response_model`` reproduce lo que hacía ``GET /tareas``: carga objetos
+del ORM, FastAPI los valida con pydantic, los convierte con ``jsonable_encoder``
+y los codifica con ``json``. El modo ``fast`` consulta las columnas y las
+serializa con ``responses.dumps``. Se mide por separado la serialización y la
+consulta más la serialización, en filas por segundo.
+
+Uso, desde la carpeta ``back``::
+
+    python -m bench.serialization --tasks 10000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from bench.seed import seed_dataset
+from models import Task, async_engine
+from responses import TASK_COLUMNS, as_dicts, dumps, orjson
+
+FIELD = create_response_field(name="Response_get_tasks", type_=list[Task])
+
+
+async def encode_response_model(tasks) -> bytes:
+    content = await serialize_response(field=FIELD, response_content=tasks)
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")
+    ).encode()
+
+
+async def encode_fast(rows) -> bytes:
+    return dumps(as_dicts(rows))
+
+
+async def query(session: AsyncSession, user_id: int, fast: bool):
+    columns = TASK_COLUMNS if fast else (Task,)
+    statement = select(*columns).where(Task.user_id == user_id).order_by(Task.id)
+    return (await session.exec(statement)).all()
+
+
+async def measure(function, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await function()
+    return (time.perf_counter() - start) / repeat
+
+
+async def run(user_id: int, repeat: int):
+    async with AsyncSession(async_engine) as session:
+        tasks = await query(session, user_id, fast=False)
+        rows = await query(session, user_id, fast=True)
+        assert json.loads(await encode_response_model(tasks)) == json.loads(
+            await encode_fast(rows)
+        )
+
+        results = {
+            "serialización": (
+                await measure(lambda: encode_response_model(tasks), repeat),
+                await measure(lambda: encode_fast(rows), repeat),
+            ),
+        }
+
+        async def full(fast: bool):
+            rows = await query(session, user_id, fast)
+            session.expunge_all()
+            await (encode_fast(rows) if fast else encode_response_model(rows))
+
+        results["consulta + serialización"] = (
+            await measure(lambda: full(False), repeat),
+            await measure(lambda: full(True), repeat),
+        )
+    await async_engine.dispose()
+
+    print(f"{len(rows)} filas, codificador: {'orjson' if orjson else 'json'}")
+    for name, (before, after) in results.items():
+        print(
+            f"{name:>26}: {len(rows) / before:10.0f} filas/s -> "
+            f"{len(rows) / after:10.0f} filas/s ({before / after:.1f}x)"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    user_id = seed_dataset(1, args.tasks, 5)[0]
+    asyncio.run(run(user_id, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Mide el tiempo de arranque en frío del objeto ``app`` del backend.
+
+Cada muestra importa ``main`` en un proceso nuevo, sin ejecutar el lifespan, por
+lo que mide solo el costo de importación que paga cada worker o cada reinicio.
+
+Uso, desde la carpeta ``back``::
+
+    python -m bench.startup --runs 20
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parents[1] / "src"
+PROGRAM = (
+    "import time; start = time.perf_counter(); import main; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def measure() -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", PROGRAM],
+        cwd=SRC,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+    samples = [measure() * 1000 for _ in range(args.runs)]
+    print(
+        f"import main: mediana={statistics.median(samples):.1f}ms"
+        f"  min={min(samples):.1f}ms  max={max(samples):.1f}ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
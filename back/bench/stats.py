@@ -0,0 +1,29 @@
+import statistics
+
+
+def summarize(latencies: list[float], elapsed: float, errors: int = 0) -> dict:
+    """Resume las latencias (en segundos) de una ejecución en milisegundos"""
+    summary = {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+    }
+    if len(latencies) >= 2:
+        quantiles = statistics.quantiles(latencies, n=100)
+        summary.update(
+            p50=quantiles[49] * 1000, p95=quantiles[94] * 1000, p99=quantiles[98] * 1000
+        )
+    return summary
+
+
+def format_summary(name: str, summary: dict) -> str:
+    line = f"{name:>14}: {summary['throughput']:8.1f} req/s"
+    if "p50" in summary:
+        line += (
+            f"  p50={summary['p50']:.1f}ms"
+            f"  p95={summary['p95']:.1f}ms"
+            f"  p99={summary['p99']:.1f}ms"
+        )
+    if summary["errors"]:
+        line += f"  errores={summary['errors']}"
+    return line
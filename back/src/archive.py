@@ -0,0 +1,195 @@
+"""Archivo de las tareas finalizadas.
+
+Las tareas en ``State.ended`` cuyo ``end_planned_date`` tiene más de
+``ARCHIVE_AFTER_DAYS`` días se mueven por lotes de ``Task`` a ``ArchivedTask``,
+para que los listados y los índices de ``Task`` solo cubran las tareas vigentes.
+``GET /tareas?archivadas=true`` las sigue incluyendo y la exportación también.
+
+Para ``/tareas/cambios`` archivar equivale a eliminar: cada tarea archivada
+recibe un ``TaskTombstone``. Los contadores del resumen incluyen las tareas
+archivadas, por lo que no cambian. Al modificar o eliminar una tarea archivada
+se restaura primero con ``TaskArchiver.restore`` y vuelve a informarse como
+modificada.
+
+El archivo se ejecuta en segundo plano cada ``ARCHIVE_INTERVAL_SECONDS``
+(``ARCHIVE_AFTER_DAYS=0`` lo desactiva) o explícitamente con::
+
+    python archive.py
+"""
+
+import asyncio
+import logging
+from datetime import date, timedelta
+
+from sqlalchemy import delete, event, insert, literal_column, or_, text, tuple_
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from changes import next_change_seq
+from conf import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, ARCHIVE_INTERVAL_SECONDS
+from models import ArchivedTask, State, Task, TaskTombstone, async_engine
+from responses import TASK_COLUMNS
+
+logger = logging.getLogger("todolist.archive")
+
+ARCHIVE_LOCK_ID = 7_310_452_002
+ARCHIVE_COLUMNS = tuple(
+    ArchivedTask.__table__.c[column.name] for column in TASK_COLUMNS
+)
+# Literal para que PostgreSQL pueda usar el índice parcial ``state = 'ended'``
+ENDED = literal_column(f"'{State.ended.name}'")
+
+
+class TaskArchiver:
+    def __init__(
+        self,
+        engine,
+        after_days: int = ARCHIVE_AFTER_DAYS,
+        batch_size: int = ARCHIVE_BATCH_SIZE,
+        interval_seconds: float = ARCHIVE_INTERVAL_SECONDS,
+    ):
+        self.engine = engine
+        self.after_days = after_days
+        self.batch_size = batch_size
+        self.interval_seconds = interval_seconds
+        self.archived = 0
+        self.restored = 0
+        self._task: asyncio.Task | None = None
+
+    async def archive_batch(self) -> int:
+        """Archiva hasta ``batch_size`` tareas en una transacción y devuelve cuántas"""
+        cutoff = date.today() - timedelta(days=self.after_days)
+        async with AsyncSession(self.engine) as session:
+            if session.bind.dialect.name == "postgresql":
+                locked = await session.execute(
+                    text("SELECT pg_try_advisory_xact_lock(:id)"),
+                    {"id": ARCHIVE_LOCK_ID},
+                )
+                if not locked.scalar():
+                    return 0
+
+            candidates = (
+                await session.exec(
+                    select(Task.id, Task.user_id)
+                    .where(Task.state == ENDED, Task.end_planned_date < cutoff)
+                    .order_by(Task.end_planned_date, Task.id)
+                    .limit(self.batch_size)
+                )
+            ).all()
+            if not candidates:
+                return 0
+
+            # Igual que en los endpoints, los usuarios se bloquean antes que sus tareas
+            change_seqs = {}
+            for user_id in sorted({user_id for _, user_id in candidates}):
+                change_seqs[user_id] = await next_change_seq(session, user_id)
+            statement = (
+                delete(Task)
+                .where(
+                    Task.id.in_([id for id, _ in candidates]),
+                    Task.state == ENDED,
+                    Task.end_planned_date < cutoff,
+                )
+                .returning(*TASK_COLUMNS)
+                .execution_options(synchronize_session=False)
+            )
+            rows = (await session.exec(statement)).all()
+            if rows:
+                await session.exec(
+                    insert(ArchivedTask), params=[row._asdict() for row in rows]
+                )
+                session.add_all(
+                    TaskTombstone(
+                        id=row.id,
+                        user_id=row.user_id,
+                        change_seq=change_seqs[row.user_id],
+                    )
+                    for row in rows
+                )
+            await session.commit()
+        self.archived += len(rows)
+        return len(rows)
+
+    async def archive(self) -> int:
+        """Archiva por lotes todas las tareas pendientes de archivar"""
+        total = 0
+        while True:
+            count = await self.archive_batch()
+            total += count
+            if count < self.batch_size:
+                return total
+
+    async def restore(
+        self,
+        session: AsyncSession,
+        user_id: int,
+        ids: list[int],
+        versions: list[tuple[int, int]] = (),
+    ) -> list[int]:
+        """Devuelve a ``Task`` las tareas archivadas de ``ids`` dentro de la transacción
+        de ``session``, con su versión original, y retorna sus ids. Las de
+        ``versions`` (pares ``(id, version)``) solo se restauran si su versión
+        coincide, para no sacar del archivo una tarea cuya modificación va a fallar.
+
+        Como las demás escrituras, se llama después de ``next_change_seq``. Solo se
+        cuentan en ``restored`` si la transacción se confirma.
+        """
+        if not ids and not versions:
+            return []
+        statement = (
+            delete(ArchivedTask)
+            .where(
+                ArchivedTask.user_id == user_id,
+                or_(
+                    ArchivedTask.id.in_(ids),
+                    tuple_(ArchivedTask.id, ArchivedTask.version).in_(versions),
+                ),
+            )
+            .returning(*ARCHIVE_COLUMNS)
+            .execution_options(synchronize_session=False)
+        )
+        rows = (await session.exec(statement)).all()
+        if rows:
+            await session.exec(insert(Task), params=[row._asdict() for row in rows])
+            event.listen(
+                session.sync_session,
+                "after_commit",
+                lambda _: self._count_restored(len(rows)),
+                once=True,
+            )
+        return [row.id for row in rows]
+
+    def _count_restored(self, count: int):
+        self.restored += count
+
+    async def _run(self):
+        while True:
+            try:
+                count = await self.archive()
+                if count:
+                    logger.info("%d tareas archivadas", count)
+            except (OSError, SQLAlchemyError):
+                logger.exception("No se pudieron archivar las tareas")
+            await asyncio.sleep(self.interval_seconds)
+
+    async def start(self):
+        if self.after_days > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+archiver = TaskArchiver(async_engine)
+
+
+async def main():
+    print(f"{await archiver.archive()} tareas archivadas")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,118 @@
+import uuid
+from datetime import datetime, timedelta, UTC
+from typing import Annotated
+
+from fastapi import Depends, HTTPException, Request
+from fastapi.security import OAuth2PasswordBearer
+from jose import JWTError, jwt
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from cache import TTLCache
+from conf import (
+    SECRET_KEY,
+    ALGORITHM,
+    ACCESS_TOKEN_EXPIRE_DAYS,
+    TOKEN_REVOCATION_CACHE_SIZE,
+)
+from models import User, TokenUser
+from replicas import replicas
+
+ACCESS_TOKEN_EXPIRE = timedelta(days=ACCESS_TOKEN_EXPIRE_DAYS)
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/usuarios/iniciar-sesion")
+
+
+class TokenAuthenticator:
+    """Dependencia que obtiene el usuario activo a partir de los claims del token.
+
+    Los tokens emitidos por ``create_access_token`` incluyen el id del usuario, por
+    lo que no es necesario consultar la base de datos. Los tokens anteriores, sin
+    ``uid``, se resuelven con una consulta y se cuentan como ``misses``.
+
+    Las revocaciones (cierre de sesión y cambio de contraseña) se guardan en memoria
+    del proceso durante la vida máxima de un token.
+    """
+
+    def __init__(self, maxsize: int = TOKEN_REVOCATION_CACHE_SIZE):
+        ttl = ACCESS_TOKEN_EXPIRE.total_seconds()
+        self.revoked_tokens = TTLCache(maxsize, ttl)
+        self.revoked_users = TTLCache(maxsize, ttl)
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    def create_access_token(self, user: User) -> str:
+        now = datetime.now(UTC)
+        to_encode = {
+            "sub": user.username,
+            "uid": user.id,
+            "jti": uuid.uuid4().hex,
+            "iat": now.timestamp(),
+            "exp": now + ACCESS_TOKEN_EXPIRE,
+        }
+        return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+    def decode(self, token: str, count: bool = True) -> dict:
+        """Valida el token y devuelve sus claims. Con ``count`` falso los rechazos no
+        se suman a ``rejected``, para los controles previos al endpoint"""
+        credentials_exception = HTTPException(
+            status_code=401, detail="Usuario o contraseña incorrectas"
+        )
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            if count:
+                self.rejected += 1
+            raise credentials_exception
+        if payload.get("sub") is None or self.is_revoked(payload):
+            if count:
+                self.rejected += 1
+            raise credentials_exception
+        return payload
+
+    def is_revoked(self, payload: dict) -> bool:
+        if payload.get("jti") and self.revoked_tokens.get(payload["jti"]):
+            return True
+        revoked_before = self.revoked_users.get(payload.get("uid"))
+        return revoked_before is not None and payload.get("iat", 0) < revoked_before
+
+    def revoke_token(self, payload: dict):
+        """Invalida un token concreto, por ejemplo al cerrar sesión"""
+        if payload.get("jti"):
+            self.revoked_tokens.set(payload["jti"], True)
+
+    def revoke_user(self, user_id: int):
+        """Invalida todos los tokens emitidos hasta ahora para un usuario"""
+        self.revoked_users.set(user_id, datetime.now(UTC).timestamp())
+
+    async def __call__(
+        self, request: Request, token: Annotated[str, Depends(oauth2_scheme)]
+    ) -> TokenUser:
+        # RateLimitMiddleware deja los claims ya validados del mismo token
+        validated = getattr(request.state, "token_payload", None)
+        if validated is not None and validated[0] == token:
+            payload = validated[1]
+        else:
+            payload = self.decode(token)
+        if payload.get("uid") is not None:
+            self.hits += 1
+            return TokenUser(id=payload["uid"], username=payload["sub"])
+
+        self.misses += 1
+        async with AsyncSession(replicas.reader()) as session:
+            statement = select(User).where(User.username == payload["sub"])
+            user = (await session.exec(statement)).one_or_none()
+        if user is None or self.is_revoked({**payload, "uid": user.id}):
+            self.rejected += 1
+            raise HTTPException(
+                status_code=401, detail="Usuario o contraseña incorrectas"
+            )
+        return TokenUser(id=user.id, username=user.username)
+
+
+get_current_user = TokenAuthenticator()
+
+
+async def get_token_payload(token: Annotated[str, Depends(oauth2_scheme)]) -> dict:
+    return get_current_user.decode(token)
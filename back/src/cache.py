@@ -0,0 +1,96 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from conf import CATEGORY_CACHE_TTL
+
+
+class TTLCache:
+    """Diccionario acotado cuyas entradas expiran después de ``ttl`` segundos.
+
+    Cuando se alcanza ``maxsize`` se descarta la entrada más antigua, que al tener
+    todas el mismo ``ttl`` es también la primera en expirar.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def set(self, key, value):
+        self._data.pop(key, None)
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            return default
+        value, expires = item
+        if expires < time.monotonic():
+            del self._data[key]
+            return default
+        return value
+
+
+class VersionedCache:
+    """Guarda una respuesta serializada junto con su ETag y un número de versión.
+
+    ``invalidate`` incrementa la versión y descarta el valor guardado. Si la
+    versión cambia mientras se carga un valor, ese valor no se guarda. Como la
+    caché es local a cada proceso, ``ttl`` limita cuánto tiempo puede servir un
+    valor que otro proceso ya modificó.
+    """
+
+    def __init__(self, ttl: float = CATEGORY_CACHE_TTL):
+        self.ttl = ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._entry: tuple[bytes, str, float] | None = None
+
+    @staticmethod
+    def etag_for(body: bytes) -> str:
+        return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+    def peek(self) -> tuple[bytes, str] | None:
+        if self._entry is None:
+            return None
+        body, etag, expires = self._entry
+        if expires < time.monotonic():
+            self._entry = None
+            return None
+        return body, etag
+
+    async def get(self, load: Callable[[], Awaitable[bytes]]) -> tuple[bytes, str]:
+        entry = self.peek()
+        if entry is not None:
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        version = self.version
+        body = await load()
+        etag = self.etag_for(body)
+        if version == self.version:
+            self._entry = (body, etag, time.monotonic() + self.ttl)
+        return body, etag
+
+    def invalidate(self):
+        self.version += 1
+        self._entry = None
+
+
+category_cache = VersionedCache()
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [c.strip().removeprefix("W/") for c in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
@@ -0,0 +1,122 @@
+"""Sincronización incremental de las tareas de un usuario.
+
+Cada transacción que modifica tareas obtiene un número de cambio con
+``next_change_seq``, que incrementa ``User.change_seq`` y lo asigna a las tareas
+creadas o modificadas (``Task.change_seq``) y a las eliminadas (``TaskTombstone``).
+La actualización bloquea la fila del usuario hasta el commit, por lo que las
+escrituras de un mismo usuario quedan serializadas y sus números de cambio se
+hacen visibles en orden: un cursor nunca salta una transacción que confirma tarde.
+"""
+
+from fastapi import HTTPException, status
+from sqlalchemy import tuple_, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from events import change_bus
+from models import Task, TaskTombstone, User
+from pagination import decode_token, encode_token
+from replicas import replicas
+from responses import TASK_COLUMNS
+
+
+async def next_change_seq(session: AsyncSession, user_id: int) -> int:
+    """Reserva el número de cambio de la transacción actual.
+
+    Debe ser la primera escritura de la transacción, para que los bloqueos se
+    tomen siempre en el mismo orden. El número se publica en ``change_bus`` al
+    confirmarse la transacción, y el usuario queda fijado a la primaria durante
+    la ventana de read-your-writes.
+    """
+    statement = (
+        update(User)
+        .where(User.id == user_id)
+        .values(change_seq=User.change_seq + 1)
+        .returning(User.change_seq)
+        .execution_options(synchronize_session=False)
+    )
+    change_seq = (await session.exec(statement)).one()[0]
+    await change_bus.publish(session, user_id, change_seq)
+    replicas.pin(user_id)
+    return change_seq
+
+
+async def current_change_cursor(session: AsyncSession, user_id: int) -> str:
+    """Cursor de ``/tareas/cambios`` que omite los cambios ya confirmados.
+
+    Si se obtiene antes de leer las tareas, ningún cambio posterior a la lectura
+    queda fuera; a lo sumo se recibe de nuevo alguno ya leído.
+    """
+    statement = select(User.change_seq).where(User.id == user_id)
+    return encode_token({"s": (await session.exec(statement)).one()})
+
+
+def decode_change_cursor(cursor: str) -> tuple[int, int | None]:
+    payload = decode_token(cursor)
+    try:
+        last_id = payload.get("id")
+        return int(payload["s"]), None if last_id is None else int(last_id)
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido"
+        )
+
+
+def _after(seq_column, id_column, position: tuple[int, int | None]):
+    seq, last_id = position
+    if last_id is None:
+        return seq_column > seq
+    return tuple_(seq_column, id_column) > (seq, last_id)
+
+
+async def get_changes(
+    session: AsyncSession, user_id: int, cursor: str | None, limit: int
+) -> dict:
+    """Obtiene hasta ``limit`` cambios posteriores a ``cursor`` en orden de aplicación,
+    como un diccionario con la forma de ``TaskChanges``.
+
+    Sin cursor devuelve todas las tareas existentes. Solo se leen cambios hasta el
+    ``User.change_seq`` actual, que ya están todos confirmados, de modo que las
+    dos consultas ven el mismo estado aunque entre ellas confirme otra transacción.
+    """
+    position = decode_change_cursor(cursor) if cursor is not None else None
+    current = (
+        await session.exec(select(User.change_seq).where(User.id == user_id))
+    ).one()
+
+    statement = select(*TASK_COLUMNS).where(
+        Task.user_id == user_id, Task.change_seq <= current
+    )
+    if position is not None:
+        statement = statement.where(_after(Task.change_seq, Task.id, position))
+    statement = statement.order_by(Task.change_seq, Task.id).limit(limit + 1)
+    changes = [
+        ((task.change_seq, task.id), task) for task in await session.exec(statement)
+    ]
+
+    if position is not None:
+        statement = (
+            select(TaskTombstone.change_seq, TaskTombstone.id)
+            .where(
+                TaskTombstone.user_id == user_id,
+                TaskTombstone.change_seq <= current,
+                _after(TaskTombstone.change_seq, TaskTombstone.id, position),
+            )
+            .order_by(TaskTombstone.change_seq, TaskTombstone.id)
+            .limit(limit + 1)
+        )
+        changes += [((seq, id), None) for seq, id in await session.exec(statement)]
+
+    changes.sort(key=lambda change: change[0])
+    more = len(changes) > limit
+    changes = changes[:limit]
+    if more:
+        next_position = {"s": changes[-1][0][0], "id": changes[-1][0][1]}
+    else:
+        next_position = {"s": current}
+    return {
+        "tasks": [task._asdict() for _, task in changes if task is not None],
+        "deleted": [id for (_, id), task in changes if task is None],
+        "cursor": encode_token(next_position),
+        "more": more,
+    }
@@ -0,0 +1,118 @@
+"""Aviso en tiempo real de los cambios de tareas a los clientes conectados.
+
+Cada transacción que reserva un número de cambio (ver ``changes``) lo publica en
+``change_bus`` y, al confirmarse, los clientes suscritos a ``/tareas/eventos``
+del mismo usuario reciben el número. Los eventos solo avisan que hay cambios: el
+cliente los obtiene con ``/tareas/cambios``, por lo que perder eventos nunca deja
+una copia local desactualizada después de reconectarse.
+
+Con ``EVENTS_PG_NOTIFY`` los avisos se envían con ``pg_notify`` dentro de la
+transacción y cada worker los recibe con ``LISTEN``, de modo que llegan a los
+clientes conectados a cualquier worker.
+"""
+
+import asyncio
+import json
+from contextlib import contextmanager
+from typing import AsyncIterator
+
+from sqlalchemy import event, func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from conf import EVENTS_HEARTBEAT_SECONDS, EVENTS_PG_NOTIFY, EVENTS_QUEUE_SIZE
+
+CHANNEL = "task_changes"
+
+
+class ChangeBus:
+    def __init__(self, queue_size: int, pg_notify: bool = False):
+        self.queue_size = queue_size
+        self.pg_notify = pg_notify
+        self.subscribers: dict[int, set[asyncio.Queue]] = {}
+        self.disconnected = 0
+        self._connection = None
+
+    @property
+    def subscriptions(self) -> int:
+        return sum(len(queues) for queues in self.subscribers.values())
+
+    @contextmanager
+    def subscribe(self, user_id: int):
+        """Cola con los números de cambio del usuario; ``None`` indica desconexión"""
+        queue = asyncio.Queue(self.queue_size)
+        self.subscribers.setdefault(user_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            self._unsubscribe(user_id, queue)
+
+    def _unsubscribe(self, user_id: int, queue: asyncio.Queue):
+        queues = self.subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[user_id]
+
+    def deliver(self, user_id: int, change_seq: int):
+        for queue in list(self.subscribers.get(user_id, ())):
+            try:
+                queue.put_nowait(change_seq)
+            except asyncio.QueueFull:
+                # El cliente no consume los eventos: se lo desconecta en lugar de
+                # acumularlos; al reconectarse se pone al día con /tareas/cambios
+                self._unsubscribe(user_id, queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+                self.disconnected += 1
+
+    async def publish(self, session: AsyncSession, user_id: int, change_seq: int):
+        """Publica ``change_seq`` cuando se confirme la transacción de ``session``"""
+        if self.pg_notify:
+            payload = f"{user_id}:{change_seq}"
+            await session.exec(select(func.pg_notify(CHANNEL, payload)))
+        else:
+            event.listen(
+                session.sync_session,
+                "after_commit",
+                lambda _: self.deliver(user_id, change_seq),
+                once=True,
+            )
+
+    def _on_notification(self, connection, pid, channel, payload):
+        user_id, change_seq = map(int, payload.split(":"))
+        self.deliver(user_id, change_seq)
+
+    async def start(self, engine):
+        """Escucha los avisos de los demás workers si se usa ``pg_notify``"""
+        if not self.pg_notify:
+            return
+        self._connection = await engine.connect()
+        raw = await self._connection.get_raw_connection()
+        await raw.driver_connection.add_listener(CHANNEL, self._on_notification)
+
+    async def stop(self):
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+
+
+change_bus = ChangeBus(EVENTS_QUEUE_SIZE, EVENTS_PG_NOTIFY)
+
+
+async def stream_events(user_id: int) -> AsyncIterator[str]:
+    """Genera los eventos del usuario en formato Server-Sent Events"""
+    with change_bus.subscribe(user_id) as queue:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                change_seq = await asyncio.wait_for(
+                    queue.get(), EVENTS_HEARTBEAT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if change_seq is None:
+                return
+            data = json.dumps({"change_seq": change_seq})
+            yield f"id: {change_seq}\nevent: cambio\ndata: {data}\n\n"
@@ -0,0 +1,72 @@
+import csv
+import io
+import json
+from typing import AsyncIterator
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from conf import EXPORT_BATCH_SIZE
+from models import ArchivedTask, ExportFormat, Task
+from replicas import replicas
+
+EXPORT_COLUMNS = [
+    Task.id,
+    Task.text,
+    Task.creation_date,
+    Task.end_planned_date,
+    Task.state,
+    Task.category_id,
+]
+MEDIA_TYPES = {
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.csv: "text/csv",
+}
+
+
+def _row_values(row) -> list:
+    return [
+        row.id,
+        row.text,
+        row.creation_date.isoformat(),
+        row.end_planned_date.isoformat(),
+        int(row.state),
+        row.category_id,
+    ]
+
+
+def _encode(rows, fmt: ExportFormat) -> str:
+    if fmt is ExportFormat.ndjson:
+        keys = [column.key for column in EXPORT_COLUMNS]
+        return "".join(
+            json.dumps(dict(zip(keys, _row_values(row))), ensure_ascii=False) + "\n"
+            for row in rows
+        )
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(_row_values(row) for row in rows)
+    return buffer.getvalue()
+
+
+async def export_tasks(user_id: int, fmt: ExportFormat) -> AsyncIterator[str]:
+    """Genera las tareas de un usuario por lotes de ``EXPORT_BATCH_SIZE`` filas.
+
+    Las filas se leen con un cursor del lado del servidor, por lo que la memoria
+    utilizada no depende del número de tareas exportadas. Después de las tareas
+    vigentes se exportan las archivadas.
+    """
+    if fmt is ExportFormat.csv:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(column.key for column in EXPORT_COLUMNS)
+        yield buffer.getvalue()
+
+    async with AsyncSession(replicas.reader(user_id)) as session:
+        for model in (Task, ArchivedTask):
+            statement = (
+                select(*(getattr(model, column.key) for column in EXPORT_COLUMNS))
+                .where(model.user_id == user_id)
+                .order_by(model.id)
+                .execution_options(yield_per=EXPORT_BATCH_SIZE)
+            )
+            result = await session.stream(statement)
+            async for rows in result.partitions():
+                yield _encode(rows, fmt)
@@ -0,0 +1,79 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException, status
+
+from conf import BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_SIZE
+
+
+def _hash(password: bytes, rounds: int) -> bytes:
+    import bcrypt
+
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _check(password: bytes, hashed: bytes) -> bool:
+    import bcrypt
+
+    return bcrypt.checkpw(password, hashed)
+
+
+class PasswordHasher:
+    """Ejecuta bcrypt en un pool de procesos dedicado.
+
+    Como máximo ``workers + queue_size`` operaciones pueden estar en curso o en
+    espera; las siguientes se rechazan con 503 en lugar de encolarse sin límite.
+    """
+
+    def __init__(
+        self,
+        workers: int = PASSWORD_HASH_WORKERS,
+        queue_size: int = PASSWORD_HASH_QUEUE_SIZE,
+        rounds: int = BCRYPT_ROUNDS,
+    ):
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.rounds = rounds
+        self.in_flight = 0
+        self.rejected = 0
+        self._executor = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self.in_flight >= self.capacity:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="El servidor está ocupado, intente de nuevo",
+                headers={"Retry-After": "1"},
+            )
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+
+    async def hash(self, password: str) -> str:
+        key = await self._run(_hash, password.encode(), self.rounds)
+        return key.decode()
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(_check, password.encode(), hashed.encode())
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
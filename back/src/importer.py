@@ -0,0 +1,233 @@
+import codecs
+import csv
+import json
+from datetime import datetime
+from typing import AsyncIterator
+
+from pydantic import ValidationError
+from sqlalchemy import insert, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from conf import IMPORT_CHUNK_SIZE, IMPORT_MAX_ERRORS
+from models import (
+    Category,
+    ExportFormat,
+    Task,
+    TaskIn,
+    TaskImportError,
+    TaskImportResult,
+    async_engine,
+)
+from changes import next_change_seq
+from summary import SummaryDelta
+
+IMPORT_COLUMNS = [
+    "text",
+    "creation_date",
+    "end_planned_date",
+    "state",
+    "category_id",
+    "user_id",
+    "change_seq",
+]
+# Número de cambio provisorio de las filas insertadas hasta reservar el definitivo
+PENDING_CHANGE_SEQ = -1
+
+
+async def iter_lines(
+    chunks: AsyncIterator[bytes], keepends: bool = False
+) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n" if keepends else line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending if keepends else pending.rstrip("\r")
+
+
+async def iter_csv_rows(
+    lines: AsyncIterator[str],
+) -> AsyncIterator[tuple[int, list[str]]]:
+    """Genera ``(línea, valores)`` por cada registro CSV de ``lines`` (con sus
+    saltos de línea). Un registro sigue en la línea siguiente mientras tenga un
+    campo entre comillas sin cerrar, como los textos con saltos de línea que
+    escribe /tareas/exportar"""
+    number = 0
+    start = 0
+    record = ""
+    async for line in lines:
+        number += 1
+        if not record:
+            start = number
+        record += line
+        # Las comillas escapadas van duplicadas: un número impar deja un campo abierto
+        if record.count('"') % 2:
+            continue
+        if record.strip():
+            yield start, next(csv.reader([record]))
+        record = ""
+    if record.strip():
+        yield start, next(csv.reader([record]))
+
+
+async def iter_records(
+    chunks: AsyncIterator[bytes], fmt: ExportFormat
+) -> AsyncIterator[tuple[int, dict | None, str | None]]:
+    """Genera ``(línea, registro, error)`` para cada registro no vacío del cuerpo"""
+    if fmt is ExportFormat.csv:
+        header = None
+        async for number, values in iter_csv_rows(iter_lines(chunks, keepends=True)):
+            if header is None:
+                header = values
+                continue
+            yield number, dict(zip(header, values)), None
+        return
+
+    number = 0
+    async for line in iter_lines(chunks):
+        number += 1
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield number, None, f"JSON inválido: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield number, None, "Se esperaba un objeto JSON"
+            continue
+        yield number, record, None
+
+
+class TaskImporter:
+    """Carga tareas por bloques de ``IMPORT_CHUNK_SIZE`` filas validadas con ``TaskIn``.
+
+    En PostgreSQL cada bloque se inserta con ``COPY``; en otros motores con un
+    ``INSERT`` ejecutado en modo executemany. Todo el archivo se importa en una
+    sola transacción.
+
+    Las filas se insertan con ``PENDING_CHANGE_SEQ`` y los contadores del resumen
+    se acumulan en memoria; recién al terminar de leer el archivo ``finish``
+    reserva el número de cambio y aplica ambos. Así la fila del usuario no queda
+    bloqueada mientras se recibe el archivo y sus demás escrituras no esperan a
+    la importación (insertar tareas nuevas no bloquea filas existentes).
+    """
+
+    def __init__(
+        self,
+        user_id: int,
+        session: AsyncSession,
+        category_ids: set[int],
+    ):
+        self.user_id = user_id
+        self.session = session
+        self.category_ids = category_ids
+        self.result = TaskImportResult(accepted=0, rejected=0, errors=[])
+        self.copy = session.bind.dialect.name == "postgresql"
+        self.delta = SummaryDelta(user_id)
+
+    def reject(self, line: int, detail: str):
+        self.result.rejected += 1
+        if len(self.result.errors) < IMPORT_MAX_ERRORS:
+            self.result.errors.append(TaskImportError(line=line, detail=detail))
+
+    def validate(self, line: int, record: dict) -> dict | None:
+        try:
+            task = TaskIn.parse_obj(record)
+        except ValidationError as e:
+            self.reject(
+                line,
+                "; ".join(
+                    f"{'.'.join(map(str, error['loc']))}: {error['msg']}"
+                    for error in e.errors()
+                ),
+            )
+            return None
+        if task.category_id not in self.category_ids:
+            self.reject(line, f"category_id: la categoría {task.category_id} no existe")
+            return None
+        return task.dict()
+
+    async def flush(self, rows: list[dict]):
+        if not rows:
+            return
+        now = datetime.now()
+        if self.copy:
+            connection = await self.session.connection()
+            raw = await connection.get_raw_connection()
+            await raw.driver_connection.copy_records_to_table(
+                Task.__tablename__,
+                columns=IMPORT_COLUMNS,
+                records=[
+                    (
+                        row["text"],
+                        now,
+                        row["end_planned_date"],
+                        row["state"].name,
+                        row["category_id"],
+                        self.user_id,
+                        PENDING_CHANGE_SEQ,
+                    )
+                    for row in rows
+                ],
+            )
+        else:
+            for row in rows:
+                row.update(
+                    creation_date=now,
+                    user_id=self.user_id,
+                    change_seq=PENDING_CHANGE_SEQ,
+                )
+            await self.session.exec(insert(Task.__table__), params=rows)
+        for row in rows:
+            self.delta.add(row["category_id"], row["state"], row["end_planned_date"])
+        self.result.accepted += len(rows)
+
+    async def finish(self):
+        """Asigna el número de cambio a las tareas importadas y actualiza el resumen"""
+        if not self.result.accepted:
+            return
+        change_seq = await next_change_seq(self.session, self.user_id)
+        await self.session.exec(
+            update(Task)
+            .where(
+                Task.user_id == self.user_id,
+                Task.change_seq == PENDING_CHANGE_SEQ,
+            )
+            .values(change_seq=change_seq)
+            .execution_options(synchronize_session=False)
+        )
+        await self.delta.apply(self.session)
+
+    async def run(self, records) -> TaskImportResult:
+        chunk = []
+        async for line, record, error in records:
+            if error is not None:
+                self.reject(line, error)
+                continue
+            row = self.validate(line, record)
+            if row is None:
+                continue
+            chunk.append(row)
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                await self.flush(chunk)
+                chunk = []
+        await self.flush(chunk)
+        await self.finish()
+        return self.result
+
+
+async def import_tasks(
+    user_id: int, chunks: AsyncIterator[bytes], fmt: ExportFormat
+) -> TaskImportResult:
+    async with AsyncSession(async_engine) as session:
+        category_ids = set((await session.exec(select(Category.id))).all())
+        importer = TaskImporter(user_id, session, category_ids)
+        result = await importer.run(iter_records(chunks, fmt))
+        await session.commit()
+    return result
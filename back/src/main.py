@@ -1,71 +1,212 @@
-import os
-from datetime import datetime, timedelta, UTC
+from contextlib import asynccontextmanager
+from datetime import date
 from typing import Annotated
 
-import bcrypt
-import uvicorn
-from fastapi import FastAPI, HTTPException, Depends, status, Body
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from jose import JWTError, jwt
+from fastapi import (
+    FastAPI,
+    HTTPException,
+    Depends,
+    status,
+    Body,
+    Query,
+    Response,
+    Header,
+    Request,
+)
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import constr
+from sqlalchemy import update, delete, or_, tuple_, union_all
 from sqlalchemy.exc import IntegrityError
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from archive import archiver
+from auth import get_current_user, get_token_payload
+from cache import category_cache, etag_matches
+from changes import current_change_cursor, get_changes, next_change_seq
+from events import change_bus, stream_events
+from export import MEDIA_TYPES, export_tasks
+from importer import import_tasks
+from conf import INIT_DB_ON_STARTUP, RATE_LIMIT_ENABLED
+from metrics import MetricsMiddleware, registry
+from migrations import init_db
+from hashing import password_hasher
+from models import (
+    User,
+    TokenUser,
+    async_engine,
+    Token,
+    Category,
+    Task,
+    TaskIn,
+    TaskInModify,
+    TaskBatch,
+    TaskInBatchModify,
+    TaskBatchItem,
+    TaskBatchResult,
+    State,
+    TaskOrder,
+    ExportFormat,
+    TaskImportResult,
+    TaskSummary,
+    TaskTombstone,
+    TaskChanges,
+    ArchivedTask,
+)
+from pagination import apply_order, encode_cursor
+from ratelimit import RateLimit, RateLimitMiddleware, admission
+from replicas import replicas
+from responses import (
+    CATEGORY_COLUMNS,
+    TASK_COLUMNS,
+    JSONRowsResponse,
+    as_dicts,
+    dumps,
+)
+from search import apply_search, terms
+from summary import SUMMARY_FIELDS, SummaryDelta, get_summary
 
-from models import User, engine, Token, Category, Task, TaskIn, TaskInModify
 
-SECRET_KEY = os.environ.get(
-    "SECRET_KEY", "fa4b5297f69d0096b2a11eddc84cae023fddceb919b8a828c9c9639529edc216"
-)
-ALGORITHM = os.environ.get("ALGORITHM", "HS256")
-ACCESS_TOKEN_EXPIRE_MINUTES = timedelta(days=30)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if INIT_DB_ON_STARTUP:
+        await init_db()
+    await change_bus.start(async_engine)
+    await replicas.start()
+    await archiver.start()
+    yield
+    await archiver.stop()
+    await replicas.stop()
+    await change_bus.stop()
+    password_hasher.shutdown()
+
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/usuarios/iniciar-sesion")
 app = FastAPI(
     title="Todo List",
     description="Esta API permite gestionar la aplicación de TODO, creando usuario, categorías y tareas",
+    lifespan=lifespan,
 )
-
-
-def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]) -> User:
-    credentials_exception = HTTPException(
-        status_code=401, detail="Usuario o contraseña incorrectas"
+if RATE_LIMIT_ENABLED:
+    app.add_middleware(
+        RateLimitMiddleware,
+        routes={
+            ("PUT", "/tareas/{id}"): RateLimit(rate=10, burst=20),
+            ("POST", "/tareas/importar"): RateLimit(rate=0.1, burst=3),
+            ("POST", "/usuarios"): RateLimit(rate=0.1, burst=5),
+            ("POST", "/usuarios/iniciar-sesion"): RateLimit(
+                rate=1, burst=10, by="username"
+            ),
+            ("PUT", "/usuarios/contrasena"): RateLimit(rate=0.1, burst=5),
+        },
+        exempt={"/tareas/eventos", "/metrics"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-
-    with Session(engine) as session:
-        statement = select(User).where(User.username == username)
-        user = session.exec(statement).one_or_none()
-    if user is None:
-        raise credentials_exception
-    return user
+app.add_middleware(MetricsMiddleware)
 
-
-def create_access_token(data: dict) -> str:
-    to_encode = data.copy()
-    expire = datetime.now(UTC) + ACCESS_TOKEN_EXPIRE_MINUTES
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+registry.callback(
+    "auth_token_hits_total",
+    "Peticiones autenticadas sin consultar la base de datos",
+    lambda: get_current_user.hits,
+    type="counter",
+)
+registry.callback(
+    "auth_token_misses_total",
+    "Peticiones autenticadas que consultaron la base de datos",
+    lambda: get_current_user.misses,
+    type="counter",
+)
+registry.callback(
+    "category_cache_hits_total",
+    "Consultas de categorías servidas desde la caché",
+    lambda: category_cache.hits,
+    type="counter",
+)
+registry.callback(
+    "category_cache_misses_total",
+    "Consultas de categorías que cargaron la base de datos",
+    lambda: category_cache.misses,
+    type="counter",
+)
+registry.callback(
+    "password_hash_in_flight",
+    "Operaciones de bcrypt en curso o en espera",
+    lambda: password_hasher.in_flight,
+)
+registry.callback(
+    "password_hash_rejected_total",
+    "Operaciones de bcrypt rechazadas por saturación",
+    lambda: password_hasher.rejected,
+    type="counter",
+)
+registry.callback(
+    "db_pool_checked_out",
+    "Conexiones del pool asíncrono en uso",
+    lambda: async_engine.pool.checkedout(),
+)
+registry.callback(
+    "admission_active",
+    "Peticiones en curso dentro del límite de concurrencia",
+    lambda: admission.active,
+)
+registry.callback(
+    "admission_waiting",
+    "Peticiones esperando un hueco del límite de concurrencia",
+    lambda: admission.waiting,
+)
+registry.callback(
+    "tasks_archived_total",
+    "Tareas finalizadas movidas al archivo",
+    lambda: archiver.archived,
+    type="counter",
+)
+registry.callback(
+    "tasks_restored_total",
+    "Tareas archivadas que volvieron a las vigentes al modificarse",
+    lambda: archiver.restored,
+    type="counter",
+)
+registry.callback(
+    "db_replicas_healthy",
+    "Réplicas de lectura disponibles",
+    lambda: len(replicas.healthy),
+)
+registry.callback(
+    "db_replica_reads_total",
+    "Lecturas enviadas a una réplica",
+    lambda: replicas.replica_reads,
+    type="counter",
+)
+registry.callback(
+    "db_primary_reads_total",
+    "Lecturas de solo lectura enviadas a la primaria",
+    lambda: replicas.primary_reads,
+    type="counter",
+)
+registry.callback(
+    "events_subscriptions",
+    "Clientes conectados a /tareas/eventos",
+    lambda: change_bus.subscriptions,
+)
+registry.callback(
+    "events_disconnected_total",
+    "Clientes desconectados por no consumir los eventos a tiempo",
+    lambda: change_bus.disconnected,
+    type="counter",
+)
 
 
 @app.post("/usuarios")
-def create_user(
+async def create_user(
     username: constr(min_length=5, to_lower=True) = Body(),
     password: constr(min_length=5) = Body(),
 ):
     """Crea un nuevo usuario para la aplicación"""
-    key = bcrypt.hashpw(password.encode(), bcrypt.gensalt())
-    user = User(username=username, password=key.decode())
+    key = await password_hasher.hash(password)
+    user = User(username=username, password=key)
     try:
-        with Session(engine) as session:
+        async with AsyncSession(async_engine) as session:
             session.add(user)
-            session.commit()
+            await session.commit()
     except IntegrityError:
         raise HTTPException(
             status_code=status.HTTP_406_NOT_ACCEPTABLE,
@@ -75,110 +216,596 @@ def create_user(
 
 
 @app.post("/usuarios/iniciar-sesion")
-def start_session(form_data: Annotated[OAuth2PasswordRequestForm, Depends()]) -> Token:
-    with Session(engine) as session:
+async def start_session(
+    form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
+) -> Token:
+    async with AsyncSession(async_engine) as session:
         statement = select(User).where(User.username == form_data.username)
-        user = session.exec(statement).one_or_none()
+        user = (await session.exec(statement)).one_or_none()
 
-    if user is None or not bcrypt.checkpw(
-        form_data.password.encode(), user.password.encode()
+    if user is None or not await password_hasher.verify(
+        form_data.password, user.password
     ):
         raise HTTPException(status_code=401, detail="Usuario o contraseña erróneo")
 
-    access_token = create_access_token({"sub": user.username})
+    access_token = get_current_user.create_access_token(user)
 
     return Token(access_token=access_token, token_type="bearer")
 
 
+@app.post("/usuarios/cerrar-sesion")
+async def end_session(payload: dict = Depends(get_token_payload)) -> str:
+    """Invalida el token con el que se realiza la petición"""
+    get_current_user.revoke_token(payload)
+    return "Sesión cerrada"
+
+
+@app.put("/usuarios/contrasena")
+async def change_password(
+    password: str = Body(),
+    new_password: constr(min_length=5) = Body(),
+    user: TokenUser = Depends(get_current_user),
+) -> str:
+    """Cambia la contraseña del usuario activo e invalida todos sus tokens"""
+    async with AsyncSession(async_engine) as session:
+        db_user = await session.get(User, user.id)
+        if db_user is None or not await password_hasher.verify(
+            password, db_user.password
+        ):
+            raise HTTPException(status_code=401, detail="Usuario o contraseña erróneo")
+        db_user.password = await password_hasher.hash(new_password)
+        session.add(db_user)
+        await session.commit()
+
+    get_current_user.revoke_user(user.id)
+    return "Contraseña actualizada"
+
+
 @app.post("/categorias")
-def create_category(name: str = Body(), description: str | None = Body()) -> Category:
+async def create_category(
+    name: str = Body(), description: str | None = Body()
+) -> Category:
     """Crea una categoría"""
     category = Category(name=name, description=description)
     try:
-        with Session(engine) as session:
+        async with AsyncSession(async_engine) as session:
             session.add(category)
-            session.commit()
-            session.refresh(category)
+            await session.commit()
+            await session.refresh(category)
 
     except IntegrityError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="La categoría ya existe"
         )
+    category_cache.invalidate()
+    replicas.pin("categories")
     return category
 
 
 @app.delete("/categorias/{id}")
-def delete_category(id: int) -> str:
+async def delete_category(id: int) -> str:
     """Elimina una categoría"""
     try:
-        with Session(engine) as session:
-            category = session.get(Category, id)
-            session.delete(category)
-            session.commit()
+        async with AsyncSession(async_engine) as session:
+            category = await session.get(Category, id)
+            await session.delete(category)
+            await session.commit()
     except IntegrityError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Existen tareas asociadas a esta categoría",
         )
+    category_cache.invalidate()
+    replicas.pin("categories")
     return "Categoría eliminada"
 
 
 @app.get("/categorias", response_model=list[Category])
-def get_category():
-    """Obtiene una lista de las categorías"""
-    with Session(engine) as session:
-        return session.exec(select(Category)).all()
+async def get_category(if_none_match: str | None = Header(default=None)):
+    """Obtiene una lista de las categorías.
+
+    La respuesta incluye un ``ETag``; si se envía en ``If-None-Match`` y las
+    categorías no han cambiado se responde 304 sin consultar la base de datos.
+    """
+
+    async def load() -> bytes:
+        async with AsyncSession(replicas.reader("categories")) as session:
+            categories = (await session.exec(select(*CATEGORY_COLUMNS))).all()
+        return dumps(as_dicts(categories))
+
+    body, etag = await category_cache.get(load)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(body, media_type="application/json", headers={"ETag": etag})
 
 
 @app.post("/tareas")
-def create_task(task: TaskIn = Body(), user: User = Depends(get_current_user)) -> Task:
+async def create_task(
+    task: TaskIn = Body(), user: TokenUser = Depends(get_current_user)
+) -> Task:
     """Crea una tarea"""
-    with Session(engine) as session:
-        task = Task(**task.dict(), user_id=user.id)
+    async with AsyncSession(async_engine) as session:
+        change_seq = await next_change_seq(session, user.id)
+        task = Task(**task.dict(), user_id=user.id, change_seq=change_seq)
         session.add(task)
-        session.commit()
-        session.refresh(task)
+        delta = SummaryDelta(user.id)
+        delta.add(task.category_id, task.state, task.end_planned_date)
+        await delta.apply(session)
+        await session.commit()
+        await session.refresh(task)
         return task
 
 
+def parse_version(if_match: str | None) -> int | None:
+    if if_match is None:
+        return None
+    try:
+        return int(if_match.strip().removeprefix("W/").strip('"'))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Encabezado If-Match inválido",
+        )
+
+
+async def restore_archived(
+    session: AsyncSession, user_id: int, id: int, version: int | None
+) -> bool:
+    """Restaura la tarea si está archivada y, cuando se envió ``version``, si esta
+    coincide; así una versión desactualizada no la saca del archivo"""
+    if version is None:
+        return bool(await archiver.restore(session, user_id, [id]))
+    return bool(await archiver.restore(session, user_id, [], [(id, version)]))
+
+
+async def raise_missing_or_conflict(session: AsyncSession, id: int, user_id: int):
+    # Una tarea archivada con otra versión también es un conflicto
+    found = False
+    for table in (Task, ArchivedTask):
+        statement = select(table.id).where(table.id == id, table.user_id == user_id)
+        found = found or (await session.exec(statement)).first() is not None
+    if not found:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Tarea no encontrada"
+        )
+    raise HTTPException(
+        status_code=status.HTTP_412_PRECONDITION_FAILED,
+        detail="La tarea fue modificada por otra petición",
+    )
+
+
 @app.put("/tareas/{id}")
-def update_task(
-    id: int, task_update: TaskInModify = Body(), user: User = Depends(get_current_user)
+async def update_task(
+    id: int,
+    response: Response,
+    task_update: TaskInModify = Body(),
+    if_match: str | None = Header(default=None),
+    user: TokenUser = Depends(get_current_user),
 ) -> str:
-    """Actualiza una tarea"""
-    with Session(engine) as session:
-        task = session.get(Task, id)
-        for k, v in task_update.dict(exclude_unset=True).items():
-            setattr(task, k, v)
-        session.add(task)
-        session.commit()
+    """Actualiza una tarea.
+
+    Si se envía la versión de la tarea, en el campo ``version`` o en el encabezado
+    ``If-Match``, la actualización solo se aplica si la tarea no cambió desde
+    entonces; en caso contrario se responde 412. La nueva versión se devuelve en
+    el encabezado ``ETag``. Si la tarea estaba archivada vuelve a las vigentes.
+    """
+    version = task_update.version or parse_version(if_match)
+    changes = task_update.dict(exclude_unset=True, exclude={"version"})
+    statement = update(Task).where(Task.id == id, Task.user_id == user.id)
+    if version is not None:
+        statement = statement.where(Task.version == version)
+    statement = statement.returning(
+        Task.version, Task.category_id, Task.state, Task.end_planned_date
+    ).execution_options(synchronize_session=False)
+
+    async with AsyncSession(async_engine) as session:
+        change_seq = await next_change_seq(session, user.id)
+        statement = statement.values(
+            **changes, version=Task.version + 1, change_seq=change_seq
+        )
+
+        async def apply():
+            previous = None
+            if SUMMARY_FIELDS & changes.keys():
+                previous = (
+                    await session.exec(
+                        select(Task.category_id, Task.state, Task.end_planned_date)
+                        .where(Task.id == id, Task.user_id == user.id)
+                        .with_for_update()
+                    )
+                ).first()
+            return previous, (await session.exec(statement)).first()
+
+        previous, row = await apply()
+        if row is None and await restore_archived(session, user.id, id, version):
+            previous, row = await apply()
+        if row is None:
+            await raise_missing_or_conflict(session, id, user.id)
+        if previous is not None:
+            delta = SummaryDelta(user.id)
+            delta.remove(*previous)
+            delta.add(row.category_id, row.state, row.end_planned_date)
+            await delta.apply(session)
+        await session.commit()
+    response.headers["ETag"] = f'"{row.version}"'
     return "Tarea actualizada"
 
 
 @app.delete("/tareas/{id}")
-def delete_task(id: int) -> str:
-    """Elimina una tarea"""
-    with Session(engine) as session:
-        task = session.get(Task, id)
-        session.delete(task)
-        session.commit()
+async def delete_task(
+    id: int,
+    version: int | None = None,
+    if_match: str | None = Header(default=None),
+    user: TokenUser = Depends(get_current_user),
+) -> str:
+    """Elimina una tarea.
+
+    Igual que en la actualización, se puede condicionar a una versión con el
+    parámetro ``version`` o el encabezado ``If-Match``.
+    """
+    version = version or parse_version(if_match)
+    statement = delete(Task).where(Task.id == id, Task.user_id == user.id)
+    if version is not None:
+        statement = statement.where(Task.version == version)
+    statement = statement.returning(
+        Task.category_id, Task.state, Task.end_planned_date
+    ).execution_options(synchronize_session=False)
+
+    async with AsyncSession(async_engine) as session:
+        change_seq = await next_change_seq(session, user.id)
+        row = (await session.exec(statement)).first()
+        if row is None and await restore_archived(session, user.id, id, version):
+            row = (await session.exec(statement)).first()
+        if row is None:
+            await raise_missing_or_conflict(session, id, user.id)
+        session.add(TaskTombstone(id=id, user_id=user.id, change_seq=change_seq))
+        delta = SummaryDelta(user.id)
+        delta.remove(*row)
+        await delta.apply(session)
+        await session.commit()
     return "Tarea eliminada"
 
 
+@app.post("/tareas/lote")
+async def batch_tasks(
+    batch: TaskBatch = Body(), user: TokenUser = Depends(get_current_user)
+) -> TaskBatchResult:
+    """Crea, actualiza y elimina varias tareas en una única transacción.
+
+    Las actualizaciones con los mismos cambios se agrupan en una sola sentencia
+    ``UPDATE``. Las tareas que no existen, no pertenecen al usuario o cuya
+    ``version`` no coincide se reportan con ``ok = false`` sin afectar al resto
+    del lote.
+    """
+    groups: dict[tuple, list[TaskInBatchModify]] = {}
+    updated: dict[int, TaskBatchItem] = {}
+    for item in batch.update:
+        changes = item.dict(exclude_unset=True, exclude={"id", "version"})
+        if not changes:
+            updated[item.id] = TaskBatchItem(id=item.id, ok=False, detail="Sin cambios")
+            continue
+        groups.setdefault(tuple(sorted(changes.items())), []).append(item)
+
+    try:
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            change_seq = await next_change_seq(session, user.id)
+            # Solo se restauran las tareas archivadas que el lote va a modificar
+            modified = [item for items in groups.values() for item in items]
+            await archiver.restore(
+                session,
+                user.id,
+                [item.id for item in modified if item.version is None] + batch.delete,
+                [
+                    (item.id, item.version)
+                    for item in modified
+                    if item.version is not None
+                ],
+            )
+            delta = SummaryDelta(user.id)
+            created = [
+                Task(**task.dict(), user_id=user.id, change_seq=change_seq)
+                for task in batch.create
+            ]
+            session.add_all(created)
+            await session.flush()
+            for task in created:
+                delta.add(task.category_id, task.state, task.end_planned_date)
+
+            for changes, items in groups.items():
+                ids = [item.id for item in items if item.version is None]
+                versions = [(i.id, i.version) for i in items if i.version is not None]
+                previous = {}
+                if SUMMARY_FIELDS & dict(changes).keys():
+                    statement = (
+                        select(
+                            Task.id,
+                            Task.category_id,
+                            Task.state,
+                            Task.end_planned_date,
+                        )
+                        .where(
+                            Task.user_id == user.id,
+                            Task.id.in_([item.id for item in items]),
+                        )
+                        .with_for_update()
+                    )
+                    previous = {
+                        row.id: row[1:] for row in (await session.exec(statement)).all()
+                    }
+                statement = (
+                    update(Task)
+                    .where(
+                        Task.user_id == user.id,
+                        or_(
+                            Task.id.in_(ids),
+                            tuple_(Task.id, Task.version).in_(versions),
+                        ),
+                    )
+                    .values(
+                        **dict(changes),
+                        version=Task.version + 1,
+                        change_seq=change_seq,
+                    )
+                    .returning(
+                        Task.id,
+                        Task.version,
+                        Task.category_id,
+                        Task.state,
+                        Task.end_planned_date,
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                found = {}
+                for row in (await session.exec(statement)).all():
+                    found[row.id] = row.version
+                    if row.id in previous:
+                        delta.remove(*previous[row.id])
+                        delta.add(row.category_id, row.state, row.end_planned_date)
+                for item in items:
+                    updated[item.id] = TaskBatchItem(
+                        id=item.id, ok=item.id in found, version=found.get(item.id)
+                    )
+
+            failed = [item.id for item in updated.values() if not item.ok]
+            if failed:
+                # Las tareas archivadas con otra versión siguen en el archivo
+                conflicts = set()
+                for table in (Task, ArchivedTask):
+                    statement = select(table.id).where(
+                        table.user_id == user.id, table.id.in_(failed)
+                    )
+                    conflicts.update((await session.exec(statement)).all())
+                for id in conflicts:
+                    if updated[id].detail is None:
+                        updated[id].detail = "Versión desactualizada"
+
+            deleted_ids = set()
+            if batch.delete:
+                statement = (
+                    delete(Task)
+                    .where(Task.user_id == user.id, Task.id.in_(batch.delete))
+                    .returning(
+                        Task.id, Task.category_id, Task.state, Task.end_planned_date
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                for row in (await session.exec(statement)).all():
+                    deleted_ids.add(row.id)
+                    delta.remove(*row[1:])
+                session.add_all(
+                    TaskTombstone(id=id, user_id=user.id, change_seq=change_seq)
+                    for id in deleted_ids
+                )
+
+            await delta.apply(session)
+            await session.commit()
+    except IntegrityError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El lote contiene una categoría que no existe",
+        )
+
+    for item in updated.values():
+        if not item.ok and item.detail is None:
+            item.detail = "Tarea no encontrada"
+    return TaskBatchResult(
+        created=created,
+        updated=[updated[item.id] for item in batch.update],
+        deleted=[
+            TaskBatchItem(
+                id=id,
+                ok=id in deleted_ids,
+                detail=None if id in deleted_ids else "Tarea no encontrada",
+            )
+            for id in batch.delete
+        ],
+    )
+
+
+@app.get("/tareas/resumen")
+async def get_task_summary(user: TokenUser = Depends(get_current_user)) -> TaskSummary:
+    """Obtiene el resumen de las tareas del usuario activo.
+
+    Incluye la cantidad de tareas por estado y por categoría, y cuántas están
+    vencidas sin finalizar. Se lee de contadores, por lo que su costo no depende
+    del número de tareas.
+    """
+    async with AsyncSession(replicas.reader(user.id)) as session:
+        return await get_summary(session, user.id)
+
+
+@app.get("/tareas/cambios", response_model=TaskChanges)
+async def get_task_changes(
+    desde: str | None = None,
+    limite: int = Query(default=500, ge=1, le=1000),
+    user: TokenUser = Depends(get_current_user),
+):
+    """Obtiene las tareas creadas, modificadas y eliminadas desde el cursor ``desde``.
+
+    Sin ``desde`` devuelve todas las tareas del usuario. La respuesta incluye el
+    cursor para la siguiente consulta; si ``more`` es verdadero quedan cambios
+    pendientes y se debe consultar de nuevo de inmediato. Para actualizar una copia
+    local se eliminan primero las tareas de ``deleted`` y luego se reemplazan o
+    agregan las de ``tasks``. Las tareas archivadas se informan como eliminadas.
+    """
+    async with AsyncSession(async_engine) as session:
+        changes = await get_changes(session, user.id, desde, limite)
+    return JSONRowsResponse(changes)
+
+
+@app.get("/tareas/eventos")
+async def get_task_events(
+    user: TokenUser = Depends(get_current_user),
+) -> StreamingResponse:
+    """Envía un evento Server-Sent Events cada vez que cambian las tareas del usuario.
+
+    El campo ``data`` contiene el ``change_seq`` del cambio; las tareas modificadas
+    se obtienen con ``/tareas/cambios``. Si el cliente no consume los eventos a
+    tiempo se cierra la conexión y debe reconectarse.
+    """
+    return StreamingResponse(
+        stream_events(user.id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/tareas/buscar", response_model=list[Task])
+async def search_tasks(
+    q: str = Query(min_length=1, max_length=200),
+    estado: State | None = None,
+    categoria_id: int | None = None,
+    limite: int = Query(default=20, ge=1, le=100),
+    user: TokenUser = Depends(get_current_user),
+):
+    """Busca tareas del usuario activo por su texto, ordenadas por relevancia.
+
+    Cada palabra de ``q`` se busca como prefijo, por ejemplo ``comp sup``
+    encuentra "Compras del supermercado".
+    """
+    words = terms(q)
+    if not words:
+        return JSONRowsResponse([])
+    statement = select(*TASK_COLUMNS).where(Task.user_id == user.id)
+    if estado is not None:
+        statement = statement.where(Task.state == estado)
+    if categoria_id is not None:
+        statement = statement.where(Task.category_id == categoria_id)
+    statement = apply_search(statement, async_engine.dialect.name, words)
+
+    async with AsyncSession(replicas.reader(user.id)) as session:
+        tasks = (await session.exec(statement.limit(limite))).all()
+    return JSONRowsResponse(as_dicts(tasks))
+
+
+@app.get("/tareas/exportar")
+async def export_user_tasks(
+    formato: ExportFormat = ExportFormat.ndjson,
+    user: TokenUser = Depends(get_current_user),
+) -> StreamingResponse:
+    """Exporta todas las tareas del usuario activo en formato NDJSON o CSV"""
+    return StreamingResponse(
+        export_tasks(user.id, formato),
+        media_type=MEDIA_TYPES[formato],
+        headers={
+            "Content-Disposition": f'attachment; filename="tareas.{formato.value}"'
+        },
+    )
+
+
+@app.post(
+    "/tareas/importar",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                media_type: {"schema": {"type": "string"}}
+                for media_type in MEDIA_TYPES.values()
+            },
+        }
+    },
+)
+async def import_user_tasks(
+    request: Request,
+    formato: ExportFormat = ExportFormat.ndjson,
+    user: TokenUser = Depends(get_current_user),
+) -> TaskImportResult:
+    """Importa tareas desde un cuerpo NDJSON o CSV enviado por streaming.
+
+    Cada fila se valida con el esquema de creación de tareas; las filas inválidas
+    se omiten y se reportan en ``errors``. Acepta el formato de ``/tareas/exportar``.
+    """
+    return await import_tasks(user.id, request.stream(), formato)
+
+
 @app.get("/tareas", response_model=list[Task])
-def get_tasks(user: User = Depends(get_current_user)):
-    """Obtiene las tareas del usuario activo"""
-    with Session(engine) as session:
-        return session.exec(select(Task).where(Task.user_id == user.id)).all()
+async def get_tasks(
+    estado: State | None = None,
+    categoria_id: int | None = None,
+    vence_desde: date | None = None,
+    vence_hasta: date | None = None,
+    orden: TaskOrder = TaskOrder.id,
+    limite: int = Query(default=100, ge=1, le=1000),
+    cursor: str | None = None,
+    archivadas: bool = False,
+    user: TokenUser = Depends(get_current_user),
+):
+    """Obtiene una página de las tareas del usuario activo.
+
+    Si quedan más tareas, el encabezado ``X-Next-Cursor`` contiene el cursor
+    que se debe enviar en el parámetro ``cursor`` para obtener la siguiente página.
+    Las tareas finalizadas hace tiempo se archivan y solo se incluyen si
+    ``archivadas`` es verdadero. En la primera página, el encabezado
+    ``X-Change-Cursor`` contiene el cursor de ``/tareas/cambios`` para seguir los
+    cambios posteriores a la consulta.
+    """
+
+    def page(table):
+        statement = select(*(table.c[column.name] for column in TASK_COLUMNS))
+        statement = statement.where(table.c.user_id == user.id)
+        if estado is not None:
+            statement = statement.where(table.c.state == estado)
+        if categoria_id is not None:
+            statement = statement.where(table.c.category_id == categoria_id)
+        if vence_desde is not None:
+            statement = statement.where(table.c.end_planned_date >= vence_desde)
+        if vence_hasta is not None:
+            statement = statement.where(table.c.end_planned_date <= vence_hasta)
+        return apply_order(statement, orden, cursor, table).limit(limite + 1)
+
+    statement = page(Task.__table__)
+    if archivadas:
+        tasks = union_all(
+            statement.subquery().select(),
+            page(ArchivedTask.__table__).subquery().select(),
+        ).subquery()
+        statement = select(
+            *(tasks.c[column.name].label(column.name) for column in TASK_COLUMNS)
+        )
+        statement = apply_order(statement, orden, table=tasks).limit(limite + 1)
 
+    headers = {}
+    async with AsyncSession(replicas.reader(user.id)) as session:
+        if cursor is None:
+            headers["X-Change-Cursor"] = await current_change_cursor(session, user.id)
+        tasks = (await session.exec(statement)).all()
+
+    if len(tasks) > limite:
+        tasks = tasks[:limite]
+        headers["X-Next-Cursor"] = encode_cursor(orden, tasks[-1])
+    return JSONRowsResponse(as_dicts(tasks), headers=headers)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics() -> PlainTextResponse:
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
-with Session(engine) as session:
-    if not session.exec(select(Category)).all():
-        session.add(Category(id=1, name="Normal"))
-        session.add(Category(id=2, name="Prioritaria"))
-        session.commit()
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
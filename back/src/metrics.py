@@ -0,0 +1,258 @@
+import bisect
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from conf import SLOW_QUERY_SECONDS, SLOW_QUERY_SAMPLE_RATE
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+logger = logging.getLogger("todolist.sql")
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        for key, value in self._values.items():
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        values = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            values[0][index] += 1
+        values[1] += value
+        values[2] += 1
+
+    def samples(self):
+        for key, (counts, total, observed) in self._values.items():
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, "le": str(bound)}, cumulative
+            yield f"{self.name}_bucket", {**labels, "le": "+Inf"}, observed
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, observed
+
+
+class CallbackMetric:
+    """Métrica cuyo valor se obtiene al momento de exportarla"""
+
+    def __init__(self, name: str, documentation: str, type: str, function):
+        self.name = name
+        self.documentation = documentation
+        self.type = type
+        self.function = function
+
+    def samples(self):
+        yield self.name, {}, self.function()
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs) -> Counter:
+        return self.register(Counter(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        return self.register(Histogram(*args, **kwargs))
+
+    def callback(self, name: str, documentation: str, function, type="gauge"):
+        return self.register(CallbackMetric(name, documentation, type, function))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    "http_requests_total", "Peticiones HTTP atendidas", ("method", "route", "status")
+)
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds",
+    "Duración de las peticiones HTTP",
+    ("method", "route"),
+)
+db_queries_per_request = registry.histogram(
+    "db_queries_per_request",
+    "Consultas SQL ejecutadas por petición",
+    ("method", "route"),
+    buckets=QUERY_COUNT_BUCKETS,
+)
+db_query_duration = registry.histogram(
+    "db_query_duration_seconds", "Duración de las consultas SQL", ("method", "route")
+)
+db_pool_checkout_wait = registry.histogram(
+    "db_pool_checkout_wait_seconds",
+    "Tiempo de espera para obtener una conexión del pool",
+)
+
+
+class RequestStats:
+    __slots__ = ("query_durations",)
+
+    def __init__(self):
+        self.query_durations: list[float] = []
+
+
+_request_stats: ContextVar[RequestStats | None] = ContextVar(
+    "request_stats", default=None
+)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = time.perf_counter()
+    # El inicio se guarda en el contexto de la sentencia, que se descarta aunque
+    # falle; ``conn.info`` dura lo que la conexión del pool
+    if context is not None:
+        context._query_start = start
+    else:
+        conn.info.setdefault("query_start", []).append(start)
+
+
+def _query_start(conn, context) -> float | None:
+    if context is not None:
+        return getattr(context, "_query_start", None)
+    starts = conn.info.get("query_start") if conn is not None else None
+    return starts.pop() if starts else None
+
+
+def _observe_query(elapsed: float, statement: str):
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.query_durations.append(elapsed)
+    else:
+        db_query_duration.observe(elapsed, method="", route="background")
+    if elapsed >= SLOW_QUERY_SECONDS and random.random() < SLOW_QUERY_SAMPLE_RATE:
+        logger.warning("Consulta lenta (%.3fs): %s", elapsed, statement)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = _query_start(conn, context)
+    if start is not None:
+        _observe_query(time.perf_counter() - start, statement)
+
+
+def _handle_error(exception_context):
+    """Registra también las consultas que fallan, para las que SQLAlchemy no
+    emite ``after_cursor_execute``"""
+    if exception_context.statement is None:
+        return
+    start = _query_start(
+        exception_context.connection, exception_context.execution_context
+    )
+    if start is not None:
+        _observe_query(time.perf_counter() - start, exception_context.statement)
+
+
+def instrument_engine(engine):
+    """Registra la duración de cada consulta ejecutada por un engine síncrono"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+class _TimedCheckoutMixin:
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_checkout_wait.observe(time.perf_counter() - start)
+
+
+class TimedQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+class MetricsMiddleware:
+    """Middleware ASGI que agrupa las consultas SQL de cada petición por endpoint"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_stats.reset(token)
+            labels = {
+                "method": scope["method"],
+                "route": getattr(scope.get("route"), "path", "unmatched"),
+            }
+            http_requests.inc(status=status_code, **labels)
+            http_request_duration.observe(time.perf_counter() - start, **labels)
+            db_queries_per_request.observe(len(stats.query_durations), **labels)
+            for elapsed in stats.query_durations:
+                db_query_duration.observe(elapsed, **labels)
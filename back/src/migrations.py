@@ -0,0 +1,105 @@
+"""Creación del esquema y datos iniciales de la base de datos.
+
+Se ejecuta al iniciar la aplicación (salvo que ``INIT_DB_ON_STARTUP`` sea falso)
+o explícitamente con ``python migrations.py``. Es idempotente, y en PostgreSQL
+se serializa con un advisory lock para que varios workers no compitan al crear
+las tablas.
+"""
+
+import asyncio
+
+from sqlalchemy import inspect, insert, select, text
+from sqlalchemy.schema import CreateColumn, CreateTable
+from sqlmodel import SQLModel
+
+from models import Category, Task, TaskCount, async_engine
+from search import create_search_index
+from summary import rebuild_summary
+
+INIT_DB_LOCK_ID = 7_310_452_001
+DEFAULT_CATEGORIES = [{"id": 1, "name": "Normal"}, {"id": 2, "name": "Prioritaria"}]
+
+
+def add_missing_columns(connection):
+    """Agrega a las tablas existentes las columnas e índices nuevos del modelo.
+
+    Las columnas nuevas deben ser nulas o tener ``server_default`` para que las
+    filas existentes reciban un valor.
+    """
+    inspector = inspect(connection)
+    for table in SQLModel.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        name = connection.dialect.identifier_preparer.format_table(table)
+        for column in table.columns:
+            if column.name not in existing:
+                ddl = CreateColumn(column).compile(dialect=connection.dialect)
+                connection.execute(text(f"ALTER TABLE {name} ADD COLUMN {ddl}"))
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+def enable_task_autoincrement(connection):
+    """Reconstruye con ``AUTOINCREMENT`` la tabla ``task`` de las bases SQLite
+    creadas antes de que el modelo lo usara.
+
+    Sin él SQLite asigna ``max(id) + 1`` y reutiliza los ids de las tareas
+    archivadas o eliminadas. El contador arranca después del mayor id de
+    ``task``, ``archivedtask`` y ``tasktombstone``. El índice de búsqueda se
+    elimina junto con sus triggers y ``create_search_index`` lo vuelve a crear.
+    """
+    if connection.dialect.name != "sqlite":
+        return
+    ddl = connection.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'task'")
+    ).scalar()
+    if ddl is None or "AUTOINCREMENT" in ddl.upper():
+        return
+
+    table = Task.__table__
+    create = str(CreateTable(table).compile(dialect=connection.dialect)).strip()
+    columns = ", ".join(column.name for column in table.columns)
+    connection.execute(text("DROP TABLE IF EXISTS task_fts"))
+    connection.execute(
+        text(create.replace("CREATE TABLE task ", "CREATE TABLE task_new ", 1))
+    )
+    connection.execute(
+        text(f"INSERT INTO task_new ({columns}) SELECT {columns} FROM task")
+    )
+    connection.execute(text("DROP TABLE task"))
+    connection.execute(text("ALTER TABLE task_new RENAME TO task"))
+    for index in table.indexes:
+        index.create(connection, checkfirst=True)
+    connection.execute(text("DELETE FROM sqlite_sequence WHERE name = 'task'"))
+    connection.execute(text("""
+            INSERT INTO sqlite_sequence (name, seq) SELECT 'task', max(
+                (SELECT coalesce(max(id), 0) FROM task),
+                (SELECT coalesce(max(id), 0) FROM archivedtask),
+                (SELECT coalesce(max(id), 0) FROM tasktombstone)
+            )
+            """))
+
+
+async def init_db():
+    async with async_engine.begin() as connection:
+        if connection.dialect.name == "postgresql":
+            await connection.execute(
+                text("SELECT pg_advisory_xact_lock(:id)"), {"id": INIT_DB_LOCK_ID}
+            )
+        await connection.run_sync(add_missing_columns)
+        summary_exists = await connection.run_sync(
+            lambda c: inspect(c).has_table(TaskCount.__tablename__)
+        )
+        await connection.run_sync(SQLModel.metadata.create_all)
+        await connection.run_sync(enable_task_autoincrement)
+        if not summary_exists:
+            await rebuild_summary(connection)
+        await create_search_index(connection)
+
+        if (await connection.execute(select(Category.id).limit(1))).first() is None:
+            await connection.execute(insert(Category), DEFAULT_CATEGORIES)
+
+
+if __name__ == "__main__":
+    asyncio.run(init_db())
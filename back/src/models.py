@@ -1,10 +1,23 @@
 from datetime import datetime, date
-from enum import IntEnum
+from enum import Enum, IntEnum
 from typing import Optional
 
-from pydantic import BaseModel, FutureDate, constr
+from pydantic import BaseModel, FutureDate, conlist, constr
+from sqlalchemy import Index, text
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import Field, SQLModel, create_engine, Relationship
-from conf import DATABASE_CONNECTION
+from conf import (
+    DATABASE_CONNECTION,
+    ASYNC_DATABASE_CONNECTION,
+    ASYNC_DATABASE_REPLICAS,
+    DATABASE_POOL_SIZE,
+    DATABASE_MAX_OVERFLOW,
+    DATABASE_POOL_TIMEOUT,
+    DATABASE_ECHO,
+)
+from metrics import instrument_engine, TimedQueuePool, TimedAsyncQueuePool
+
+BATCH_MAX_ITEMS = 1000
 
 
 class State(IntEnum):
@@ -13,6 +26,18 @@ class State(IntEnum):
     ended = 3
 
 
+class TaskOrder(str, Enum):
+    id = "id"
+    id_desc = "-id"
+    end_planned_date = "end_planned_date"
+    end_planned_date_desc = "-end_planned_date"
+
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
 class Category(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str = Field(unique=True)
@@ -32,9 +57,33 @@ class TaskInModify(BaseModel):
     end_planned_date: date = None
     state: State = None
     category_id: int = None
+    version: int | None = None
 
 
 class Task(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_task_user_id_id", "user_id", "id"),
+        Index("ix_task_user_end_planned_date", "user_id", "end_planned_date", "id"),
+        Index(
+            "ix_task_user_state_end_planned_date",
+            "user_id",
+            "state",
+            "end_planned_date",
+            "id",
+        ),
+        Index("ix_task_user_category_id", "user_id", "category_id", "id"),
+        Index("ix_task_user_change_seq", "user_id", "change_seq", "id"),
+        Index(
+            "ix_task_ended_end_planned_date",
+            "end_planned_date",
+            "id",
+            postgresql_where=text("state = 'ended'"),
+            sqlite_where=text("state = 'ended'"),
+        ),
+        # Sin AUTOINCREMENT SQLite reutiliza los ids más altos al archivarlos
+        {"sqlite_autoincrement": True},
+    )
+
     id: Optional[int] = Field(
         default=None,
         primary_key=True,
@@ -45,22 +94,150 @@ class Task(SQLModel, table=True):
     state: State
     category_id: int = Field(foreign_key="category.id")
     user_id: int = Field(foreign_key="user.id")
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
+    change_seq: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
     user: "User" = Relationship(back_populates="tasks")
     category: Category = Relationship(back_populates="tasks")
 
 
+class ArchivedTask(SQLModel, table=True):
+    """Tarea finalizada movida fuera de ``Task`` por ``archive.TaskArchiver``.
+
+    Tiene las mismas columnas que ``Task``; al modificarla o eliminarla vuelve
+    primero a ``Task``.
+    """
+
+    __table_args__ = (
+        Index("ix_archivedtask_user_id_id", "user_id", "id"),
+        Index(
+            "ix_archivedtask_user_end_planned_date", "user_id", "end_planned_date", "id"
+        ),
+        Index("ix_archivedtask_user_category_id", "user_id", "category_id", "id"),
+    )
+
+    id: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    text: str
+    creation_date: datetime
+    end_planned_date: date
+    state: State
+    category_id: int = Field(foreign_key="category.id")
+    user_id: int = Field(foreign_key="user.id")
+    version: int
+    change_seq: int
+
+
+class TaskInBatchModify(TaskInModify):
+    id: int
+
+
+class TaskBatch(BaseModel):
+    create: conlist(TaskIn, max_items=BATCH_MAX_ITEMS) = []
+    update: conlist(TaskInBatchModify, max_items=BATCH_MAX_ITEMS) = []
+    delete: conlist(int, max_items=BATCH_MAX_ITEMS) = []
+
+
+class TaskBatchItem(BaseModel):
+    id: int
+    ok: bool
+    version: int | None = None
+    detail: str | None = None
+
+
+class TaskBatchResult(BaseModel):
+    created: list[Task]
+    updated: list[TaskBatchItem]
+    deleted: list[TaskBatchItem]
+
+
+class TaskImportError(BaseModel):
+    line: int
+    detail: str
+
+
+class TaskImportResult(BaseModel):
+    accepted: int
+    rejected: int
+    errors: list[TaskImportError]
+
+
 class User(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     username: constr(min_length=5, to_lower=True) = Field(default=None, unique=True)
     password: constr(min_length=5)
+    change_seq: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
     tasks: list[Task] = Relationship(back_populates="user")
 
 
-engine = create_engine(DATABASE_CONNECTION, echo=True)
+class TaskTombstone(SQLModel, table=True):
+    """Registro de una tarea eliminada, para informarla en ``/tareas/cambios``"""
+
+    __table_args__ = (
+        Index("ix_tasktombstone_user_change_seq", "user_id", "change_seq", "id"),
+    )
+
+    id: int = Field(primary_key=True)
+    change_seq: int = Field(primary_key=True)
+    user_id: int
+
+
+class TaskChanges(BaseModel):
+    tasks: list[Task]
+    deleted: list[int]
+    cursor: str
+    more: bool
+
+
+class TaskCount(SQLModel, table=True):
+    user_id: int = Field(primary_key=True)
+    category_id: int = Field(primary_key=True)
+    state: State = Field(primary_key=True)
+    count: int = 0
+
 
-SQLModel.metadata.create_all(engine)
+class TaskDueCount(SQLModel, table=True):
+    """Tareas sin finalizar de cada usuario agrupadas por fecha de vencimiento"""
+
+    user_id: int = Field(primary_key=True)
+    end_planned_date: date = Field(primary_key=True)
+    count: int = 0
+
+
+class TaskSummary(BaseModel):
+    total: int
+    overdue: int
+    by_state: dict[State, int]
+    by_category: dict[int, int]
+
+
+engine = create_engine(
+    DATABASE_CONNECTION, echo=DATABASE_ECHO, poolclass=TimedQueuePool
+)
+instrument_engine(engine)
+
+
+def _create_async_engine(url: str):
+    async_engine = create_async_engine(
+        url,
+        echo=DATABASE_ECHO,
+        poolclass=TimedAsyncQueuePool,
+        pool_size=DATABASE_POOL_SIZE,
+        max_overflow=DATABASE_MAX_OVERFLOW,
+        pool_timeout=DATABASE_POOL_TIMEOUT,
+        pool_pre_ping=True,
+    )
+    instrument_engine(async_engine.sync_engine)
+    return async_engine
+
+
+async_engine = _create_async_engine(ASYNC_DATABASE_CONNECTION)
+replica_engines = [_create_async_engine(url) for url in ASYNC_DATABASE_REPLICAS]
 
 
 class Token(BaseModel):
     access_token: str
     token_type: str
+
+
+class TokenUser(BaseModel):
+    id: int
+    username: str
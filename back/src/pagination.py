@@ -0,0 +1,101 @@
+import base64
+import json
+from datetime import date
+
+from fastapi import HTTPException, status
+from sqlalchemy import tuple_
+
+from models import Task, TaskOrder
+
+ORDER_COLUMNS = {
+    TaskOrder.id: None,
+    TaskOrder.id_desc: None,
+    TaskOrder.end_planned_date: Task.end_planned_date,
+    TaskOrder.end_planned_date_desc: Task.end_planned_date,
+}
+
+
+def _descending(order: TaskOrder) -> bool:
+    return order.value.startswith("-")
+
+
+def _invalid_cursor() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido"
+    )
+
+
+def encode_token(payload: dict) -> str:
+    """Codifica ``payload`` como un cursor opaco"""
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_token(cursor: str) -> dict:
+    try:
+        payload = json.loads(
+            base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        )
+    except ValueError:
+        raise _invalid_cursor()
+    if not isinstance(payload, dict):
+        raise _invalid_cursor()
+    return payload
+
+
+def encode_cursor(order: TaskOrder, task: Task) -> str:
+    """Codifica la posición de la última tarea de una página en un cursor opaco"""
+    column = ORDER_COLUMNS[order]
+    value = getattr(task, column.key) if column is not None else None
+    return encode_token(
+        {
+            "o": order.value,
+            "v": value.isoformat() if isinstance(value, date) else value,
+            "id": task.id,
+        }
+    )
+
+
+def decode_cursor(cursor: str, order: TaskOrder) -> tuple:
+    payload = decode_token(cursor)
+    try:
+        if payload["o"] != order.value:
+            raise _invalid_cursor()
+        last_id = int(payload["id"])
+        value = payload["v"]
+        if ORDER_COLUMNS[order] is not None:
+            value = date.fromisoformat(value)
+    except (ValueError, KeyError, TypeError):
+        raise _invalid_cursor()
+    return value, last_id
+
+
+def apply_order(
+    statement, order: TaskOrder, cursor: str | None = None, table=Task.__table__
+):
+    """Ordena la consulta y, si hay cursor, la posiciona después de la última fila vista.
+
+    La comparación por tupla ``(columna, id) > (valor, último_id)`` usa los índices
+    compuestos de ``Task``, por lo que una página profunda cuesta lo mismo que la primera.
+    ``table`` permite ordenar por las columnas del mismo nombre de otra tabla o
+    subconsulta en lugar de ``Task``.
+    """
+    columns = table.c
+    column = ORDER_COLUMNS[order]
+    if column is not None:
+        column = columns[column.key]
+    id_column = columns.id
+    descending = _descending(order)
+    keys = [id_column] if column is None else [column, id_column]
+
+    if cursor is not None:
+        value, last_id = decode_cursor(cursor, order)
+        if column is None:
+            position, current = id_column, last_id
+        else:
+            position, current = tuple_(column, id_column), (value, last_id)
+        statement = statement.where(
+            position < current if descending else position > current
+        )
+
+    return statement.order_by(*(k.desc() if descending else k.asc() for k in keys))
@@ -0,0 +1,318 @@
+"""Limitación de peticiones y control de admisión.
+
+``RateLimitMiddleware`` descuenta cada petición de tres token buckets: el de la
+IP del cliente, el del usuario del token (si lo hay) y, para las rutas con un
+límite propio, el de esa ruta y ese usuario o IP (o el campo del cuerpo indicado
+en ``RateLimit.by``, como el nombre de usuario al iniciar sesión). Si alguno está
+vacío responde 429 con ``Retry-After``.
+
+Cuando la petición llega desde uno de ``TRUSTED_PROXIES`` (por ejemplo el front
+end de Flet, que hace las peticiones en nombre de todos los navegadores), la IP
+del cliente se toma de ``X-Forwarded-For``.
+
+Además limita cuántas peticiones se atienden a la vez (por defecto tantas como
+conexiones tiene el pool); las que exceden el límite esperan en una cola corta
+y, si la cola está llena o la espera se agota, se responden con 503 y
+``Retry-After``, igual que cuando se satura el hasheo de contraseñas.
+"""
+
+import asyncio
+import json
+import math
+import time
+from collections import OrderedDict
+from ipaddress import ip_address, ip_network
+from urllib.parse import parse_qs
+
+from fastapi import HTTPException
+from starlette.routing import compile_path
+
+from auth import get_current_user
+from conf import (
+    ADMISSION_CONCURRENCY,
+    ADMISSION_QUEUE_SIZE,
+    ADMISSION_TIMEOUT,
+    RATE_LIMIT_BUCKETS,
+    RATE_LIMIT_IP_BURST,
+    RATE_LIMIT_IP_RATE,
+    RATE_LIMIT_USER_BURST,
+    RATE_LIMIT_USER_RATE,
+    TRUSTED_PROXIES,
+)
+from metrics import registry
+
+rate_limited = registry.counter(
+    "rate_limited_total", "Peticiones rechazadas por límite de peticiones", ("scope",)
+)
+admission_rejected = registry.counter(
+    "admission_rejected_total", "Peticiones rechazadas por exceso de concurrencia"
+)
+
+
+# Cuerpo máximo que se lee para obtener el campo de ``RateLimit.by``
+BODY_KEY_LIMIT = 64 * 1024
+
+
+class RateLimit:
+    """``rate`` peticiones por segundo con ráfagas de hasta ``burst``. Con ``by``, el
+    límite de una ruta se aplica por ese campo del cuerpo (JSON o formulario) en
+    lugar de por usuario o IP"""
+
+    def __init__(self, rate: float, burst: int, by: str | None = None):
+        self.rate = rate
+        self.burst = burst
+        self.by = by
+
+
+class TokenBuckets:
+    """Token buckets por clave; se conservan las ``maxsize`` usadas más recientemente"""
+
+    def __init__(self, limit: RateLimit, maxsize: int = RATE_LIMIT_BUCKETS):
+        self.limit = limit
+        self.maxsize = maxsize
+        self._buckets: OrderedDict = OrderedDict()
+
+    def take(self, key) -> float:
+        """Descuenta un token y devuelve 0, o los segundos hasta que haya uno"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (self.limit.burst, now))
+        tokens = min(self.limit.burst, tokens + (now - updated) * self.limit.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.limit.rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class AdmissionControl:
+    def __init__(
+        self,
+        concurrency: int = ADMISSION_CONCURRENCY,
+        queue_size: int = ADMISSION_QUEUE_SIZE,
+        timeout: float = ADMISSION_TIMEOUT,
+    ):
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def acquire(self) -> bool:
+        if self._semaphore.locked():
+            if self.waiting >= self.queue_size:
+                return False
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                return False
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+        self.active += 1
+        return True
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+
+admission = AdmissionControl()
+
+
+def _header(scope, name: bytes) -> str | None:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _bearer_user(scope) -> int | None:
+    """Usuario del token de la petición. Los claims validados quedan en
+    ``request.state.token_payload`` para que ``get_current_user`` no vuelva a
+    decodificar el token"""
+    scheme, _, token = (_header(scope, b"authorization") or "").partition(" ")
+    if scheme.lower() != "bearer":
+        return None
+    try:
+        payload = get_current_user.decode(token, count=False)
+    except HTTPException:
+        return None
+    scope.setdefault("state", {})["token_payload"] = (token, payload)
+    return payload.get("uid")
+
+
+def _is_trusted(ip: str | None, proxies) -> bool:
+    try:
+        address = ip_address(ip)
+    except ValueError:
+        return False
+    return any(address in proxy for proxy in proxies)
+
+
+def client_ip(scope, proxies=()) -> str | None:
+    """IP del cliente. Si la conexión viene de un proxy de confianza se recorre
+    ``X-Forwarded-For`` de derecha a izquierda hasta la primera IP que no lo es"""
+    client = scope.get("client")
+    ip = client[0] if client else None
+    if not proxies or not _is_trusted(ip, proxies):
+        return ip
+    hops = [
+        hop.strip()
+        for name, value in scope["headers"]
+        if name == b"x-forwarded-for"
+        for hop in value.decode("latin-1").split(",")
+        if hop.strip()
+    ]
+    for hop in reversed(hops):
+        if not _is_trusted(hop, proxies):
+            return hop
+        ip = hop
+    return ip
+
+
+async def _read_body(receive) -> tuple[bytes, list]:
+    """Lee hasta ``BODY_KEY_LIMIT`` bytes del cuerpo y devuelve también los mensajes
+    leídos, para volver a entregarlos a la aplicación"""
+    messages = []
+    size = 0
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            break
+        size += len(message.get("body", b""))
+        if not message.get("more_body") or size > BODY_KEY_LIMIT:
+            break
+    body = b"".join(message.get("body", b"") for message in messages)
+    return body, messages
+
+
+def _body_field(scope, body: bytes, field: str) -> str | None:
+    content_type = (_header(scope, b"content-type") or "").split(";")[0].strip()
+    try:
+        if content_type == "application/x-www-form-urlencoded":
+            values = parse_qs(body.decode())
+            value = values.get(field, [None])[0]
+        elif content_type == "application/json":
+            value = json.loads(body).get(field)
+        else:
+            return None
+    except (ValueError, AttributeError):
+        return None
+    return value if isinstance(value, str) and value else None
+
+
+def _replay(messages: list, receive):
+    async def replay():
+        if messages:
+            return messages.pop(0)
+        return await receive()
+
+    return replay
+
+
+class RateLimitMiddleware:
+    """Middleware ASGI de límites por usuario, IP y ruta, y de control de admisión.
+
+    ``routes`` asocia ``(método, ruta)`` a un ``RateLimit`` propio, con rutas en el
+    formato de FastAPI (``/tareas/{id}``). Las rutas de ``exempt`` (por ejemplo las
+    conexiones de larga duración) no cuentan para la concurrencia.
+    """
+
+    def __init__(
+        self,
+        app,
+        routes: dict[tuple[str, str], RateLimit] | None = None,
+        exempt: set[str] = frozenset(),
+        user_limit: RateLimit = RateLimit(RATE_LIMIT_USER_RATE, RATE_LIMIT_USER_BURST),
+        ip_limit: RateLimit = RateLimit(RATE_LIMIT_IP_RATE, RATE_LIMIT_IP_BURST),
+        admission: AdmissionControl = admission,
+        trusted_proxies: list[str] = TRUSTED_PROXIES,
+    ):
+        self.app = app
+        self.trusted_proxies = [ip_network(proxy) for proxy in trusted_proxies]
+        self.users = TokenBuckets(user_limit)
+        self.ips = TokenBuckets(ip_limit)
+        self.routes = [
+            (method, compile_path(path)[0], TokenBuckets(limit))
+            for (method, path), limit in (routes or {}).items()
+        ]
+        self.exempt = exempt
+        self.admission = admission
+
+    def _route_buckets(self, method: str, path: str) -> TokenBuckets | None:
+        for route_method, regex, buckets in self.routes:
+            if route_method == method and regex.match(path):
+                return buckets
+        return None
+
+    async def _check(self, scope, receive) -> tuple[tuple[str, float] | None, object]:
+        """Devuelve el bucket agotado y su espera (o ``None``) y el ``receive`` que
+        debe usar la aplicación, que repite el cuerpo si hubo que leerlo"""
+        ip = client_ip(scope, self.trusted_proxies)
+        user_id = _bearer_user(scope)
+        checks = [("ip", self.ips, ip)]
+        if user_id is not None:
+            checks.append(("user", self.users, user_id))
+        route = self._route_buckets(scope["method"], scope["path"])
+        if route is not None:
+            key = user_id if user_id is not None else ip
+            if route.limit.by is not None:
+                body, messages = await _read_body(receive)
+                receive = _replay(messages, receive)
+                value = _body_field(scope, body, route.limit.by)
+                if value is not None:
+                    key = (route.limit.by, value)
+            checks.append(("route", route, key))
+        for name, buckets, key in checks:
+            wait = buckets.take(key)
+            if wait:
+                return (name, wait), receive
+        return None, receive
+
+    async def _reject(self, send, status: int, detail: str, retry_after: float):
+        body = json.dumps({"detail": detail}).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        limited, receive = await self._check(scope, receive)
+        if limited is not None:
+            name, wait = limited
+            rate_limited.inc(scope=name)
+            return await self._reject(
+                send, 429, "Demasiadas peticiones, intente más tarde", wait
+            )
+
+        if scope["path"] in self.exempt:
+            return await self.app(scope, receive, send)
+
+        if not await self.admission.acquire():
+            admission_rejected.inc()
+            return await self._reject(
+                send, 503, "El servidor está ocupado, intente más tarde", 1
+            )
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.admission.release()
@@ -0,0 +1,100 @@
+"""Enrutamiento de las lecturas a las réplicas de la base de datos.
+
+Las escrituras siempre usan ``async_engine`` (la primaria). Los endpoints de solo
+lectura obtienen su engine con ``replicas.reader``, que reparte las consultas
+entre las réplicas sanas en round-robin y usa la primaria si no hay ninguna.
+
+Como las réplicas pueden estar atrasadas, después de una escritura se puede fijar
+una clave (el id del usuario, ``"categories"``) a la primaria durante
+``READ_YOUR_WRITES_SECONDS`` con ``pin``, para que quien escribió vea su cambio.
+La ventana es local a cada proceso.
+"""
+
+import asyncio
+import itertools
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from cache import TTLCache
+from conf import (
+    READ_YOUR_WRITES_SECONDS,
+    REPLICA_HEALTH_CHECK_SECONDS,
+    REPLICA_HEALTH_CHECK_TIMEOUT,
+)
+from models import async_engine, replica_engines
+
+logger = logging.getLogger("todolist.replicas")
+
+
+class ReplicaRouter:
+    def __init__(
+        self,
+        primary,
+        replicas: list,
+        pin_seconds: float = READ_YOUR_WRITES_SECONDS,
+        check_seconds: float = REPLICA_HEALTH_CHECK_SECONDS,
+        check_timeout: float = REPLICA_HEALTH_CHECK_TIMEOUT,
+    ):
+        self.primary = primary
+        self.replicas = replicas
+        self.healthy = list(replicas)
+        self.pins = TTLCache(100_000, pin_seconds) if pin_seconds > 0 else None
+        self.check_seconds = check_seconds
+        self.check_timeout = check_timeout
+        self.primary_reads = 0
+        self.replica_reads = 0
+        self._counter = itertools.count()
+        self._task: asyncio.Task | None = None
+
+    def pin(self, key):
+        """Envía a la primaria las lecturas de ``key`` durante la ventana configurada"""
+        if self.pins is not None and self.replicas:
+            self.pins.set(key, True)
+
+    def reader(self, key=None):
+        """Engine para una consulta de solo lectura asociada a ``key``"""
+        healthy = self.healthy
+        if not healthy or (self.pins is not None and self.pins.get(key, False)):
+            self.primary_reads += 1
+            return self.primary
+        self.replica_reads += 1
+        return healthy[next(self._counter) % len(healthy)]
+
+    async def _is_healthy(self, engine) -> bool:
+        try:
+            async with asyncio.timeout(self.check_timeout):
+                async with engine.connect() as connection:
+                    await connection.execute(text("SELECT 1"))
+        except (OSError, SQLAlchemyError, TimeoutError):
+            return False
+        return True
+
+    async def check(self):
+        results = await asyncio.gather(*map(self._is_healthy, self.replicas))
+        healthy = [engine for engine, ok in zip(self.replicas, results) if ok]
+        for engine in set(self.healthy) ^ set(healthy):
+            state = "disponible" if engine in healthy else "no disponible"
+            logger.warning("Réplica %s %s", engine.url.host or engine.url, state)
+        self.healthy = healthy
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.check_seconds)
+            await self.check()
+
+    async def start(self):
+        if self.replicas:
+            await self.check()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for engine in self.replicas:
+            await engine.dispose()
+
+
+replicas = ReplicaRouter(async_engine, replica_engines)
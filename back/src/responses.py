@@ -0,0 +1,47 @@
+"""Serialización rápida de listados.
+
+Los endpoints que devuelven muchas filas las consultan como columnas (sin crear
+objetos del ORM) y las serializan directamente con ``JSONRowsResponse``, sin
+la validación de ``response_model``, que en esos endpoints solo se conserva para
+documentar el esquema en OpenAPI. Se usa ``orjson`` si está instalado.
+"""
+
+import json
+from datetime import date, datetime
+
+from fastapi.responses import Response
+
+from models import Category, Task
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+TASK_COLUMNS = tuple(Task.__table__.columns)
+CATEGORY_COLUMNS = tuple(Category.__table__.columns)
+
+
+def _default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} no es serializable")
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(
+        content, default=_default, ensure_ascii=False, separators=(",", ":")
+    ).encode()
+
+
+def as_dicts(rows) -> list[dict]:
+    return [row._asdict() for row in rows]
+
+
+class JSONRowsResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
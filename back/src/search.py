@@ -0,0 +1,94 @@
+"""Búsqueda de texto completo sobre las tareas.
+
+En PostgreSQL ``task`` tiene la columna generada ``search_vector`` con un índice
+GIN compuesto con ``user_id`` (extensión ``btree_gin``), de modo que la búsqueda
+solo recorre las tareas del usuario. En SQLite se usa la tabla virtual FTS5
+``task_fts``, que se mantiene sincronizada con triggers. Ambas se crean en ``init_db``.
+"""
+
+import re
+
+from sqlalchemy import cast, column, func, literal_column, table, text
+from sqlalchemy.dialects.postgresql import REGCONFIG
+
+from conf import SEARCH_LANGUAGE
+from models import Task
+
+_WORD = re.compile(r"\w+")
+
+_task_fts = table("task_fts", column("rowid"), column("rank"))
+_search_vector = literal_column(f"{Task.__tablename__}.search_vector")
+
+_POSTGRESQL_DDL = [
+    f"""
+    ALTER TABLE task ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (to_tsvector('{SEARCH_LANGUAGE}', coalesce("text", ''))) STORED
+    """,
+    "CREATE EXTENSION IF NOT EXISTS btree_gin",
+    """
+    CREATE INDEX IF NOT EXISTS ix_task_user_search_vector
+    ON task USING GIN (user_id, search_vector)
+    """,
+]
+
+_SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE task_fts USING fts5(
+        text, content='task', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER task_fts_insert AFTER INSERT ON task BEGIN
+        INSERT INTO task_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER task_fts_delete AFTER DELETE ON task BEGIN
+        INSERT INTO task_fts(task_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER task_fts_update AFTER UPDATE OF text ON task BEGIN
+        INSERT INTO task_fts(task_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO task_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    "INSERT INTO task_fts(task_fts) VALUES ('rebuild')",
+]
+
+
+async def create_search_index(connection):
+    """Crea el índice de búsqueda si no existe. Es idempotente"""
+    if connection.dialect.name == "postgresql":
+        for ddl in _POSTGRESQL_DDL:
+            await connection.execute(text(ddl))
+    elif connection.dialect.name == "sqlite":
+        exists = await connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'task_fts'")
+        )
+        if exists.first() is None:
+            for ddl in _SQLITE_DDL:
+                await connection.execute(text(ddl))
+
+
+def terms(query: str) -> list[str]:
+    return _WORD.findall(query.lower())
+
+
+def apply_search(statement, dialect_name: str, words: list[str]):
+    """Filtra las tareas que tienen palabras que empiezan con cada uno de los
+    términos y las ordena por relevancia"""
+    if dialect_name == "postgresql":
+        tsquery = func.to_tsquery(
+            cast(SEARCH_LANGUAGE, REGCONFIG), " & ".join(f"{w}:*" for w in words)
+        )
+        return statement.where(_search_vector.op("@@")(tsquery)).order_by(
+            func.ts_rank(_search_vector, tsquery).desc(), Task.id.desc()
+        )
+
+    match = " ".join(f'"{word}"*' for word in words)
+    return (
+        statement.join(_task_fts, _task_fts.c.rowid == Task.id)
+        .where(literal_column("task_fts").op("MATCH")(match))
+        .order_by(_task_fts.c.rank, Task.id.desc())
+    )
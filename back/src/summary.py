@@ -0,0 +1,163 @@
+"""Contadores de tareas por usuario, mantenidos en la misma transacción que las tareas.
+
+``TaskCount`` guarda cuántas tareas tiene cada usuario por categoría y estado, y
+``TaskDueCount`` cuántas tareas sin finalizar vencen en cada fecha. Las tareas
+archivadas (siempre finalizadas) se cuentan en ``TaskCount``. Si los
+contadores se desincronizan se pueden reconstruir con::
+
+    python summary.py [--user ID]
+"""
+
+import argparse
+import asyncio
+from collections import Counter
+from datetime import date
+
+from sqlalchemy import delete, func, insert, select, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models import (
+    ArchivedTask,
+    State,
+    Task,
+    TaskCount,
+    TaskDueCount,
+    TaskSummary,
+    async_engine,
+)
+
+SUMMARY_FIELDS = {"category_id", "state", "end_planned_date"}
+
+
+def _upsert(dialect_name: str, model, keys: list[str]):
+    dialect = postgresql if dialect_name == "postgresql" else sqlite
+    statement = dialect.insert(model)
+    return statement.on_conflict_do_update(
+        index_elements=keys, set_={"count": model.count + statement.excluded.count}
+    )
+
+
+class SummaryDelta:
+    """Acumula los cambios de los contadores de un usuario para aplicarlos juntos"""
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.counts = Counter()
+        self.due = Counter()
+
+    def add(self, category_id: int, state: State, end_planned_date: date, sign=1):
+        state = State(state)
+        self.counts[category_id, state] += sign
+        if state is not State.ended:
+            self.due[end_planned_date] += sign
+
+    def remove(self, category_id: int, state: State, end_planned_date: date):
+        self.add(category_id, state, end_planned_date, sign=-1)
+
+    async def apply(self, session: AsyncSession):
+        dialect_name = session.bind.dialect.name
+        counts = [
+            {"user_id": self.user_id, "category_id": c, "state": s, "count": n}
+            for (c, s), n in self.counts.items()
+            if n
+        ]
+        due = [
+            {"user_id": self.user_id, "end_planned_date": d, "count": n}
+            for d, n in self.due.items()
+            if n
+        ]
+        if counts:
+            statement = _upsert(
+                dialect_name, TaskCount, ["user_id", "category_id", "state"]
+            )
+            await session.exec(statement, params=counts)
+        if due:
+            statement = _upsert(
+                dialect_name, TaskDueCount, ["user_id", "end_planned_date"]
+            )
+            await session.exec(statement, params=due)
+        if any(n < 0 for n in self.counts.values()):
+            await session.exec(
+                delete(TaskCount).where(
+                    TaskCount.user_id == self.user_id, TaskCount.count <= 0
+                )
+            )
+        if any(n < 0 for n in self.due.values()):
+            await session.exec(
+                delete(TaskDueCount).where(
+                    TaskDueCount.user_id == self.user_id, TaskDueCount.count <= 0
+                )
+            )
+        self.counts.clear()
+        self.due.clear()
+
+
+async def get_summary(session: AsyncSession, user_id: int) -> TaskSummary:
+    statement = select(TaskCount.category_id, TaskCount.state, TaskCount.count).where(
+        TaskCount.user_id == user_id
+    )
+    by_state = {state: 0 for state in State}
+    by_category = Counter()
+    for category_id, state, count in (await session.exec(statement)).all():
+        by_state[state] += count
+        by_category[category_id] += count
+
+    statement = select(func.coalesce(func.sum(TaskDueCount.count), 0)).where(
+        TaskDueCount.user_id == user_id, TaskDueCount.end_planned_date < date.today()
+    )
+    overdue = (await session.exec(statement)).one()[0]
+    return TaskSummary(
+        total=sum(by_state.values()),
+        overdue=overdue,
+        by_state=by_state,
+        by_category=dict(by_category),
+    )
+
+
+async def rebuild_summary(connection, user_id: int | None = None):
+    """Recalcula los contadores a partir de las tablas de tareas"""
+    selects = []
+    for model in (Task, ArchivedTask):
+        statement = select(model.user_id, model.category_id, model.state)
+        if user_id is not None:
+            statement = statement.where(model.user_id == user_id)
+        selects.append(statement)
+    tasks = union_all(*selects).subquery()
+    counts = select(
+        tasks.c.user_id, tasks.c.category_id, tasks.c.state, func.count()
+    ).group_by(tasks.c.user_id, tasks.c.category_id, tasks.c.state)
+    due = (
+        select(Task.user_id, Task.end_planned_date, func.count())
+        .where(Task.state != State.ended)
+        .group_by(Task.user_id, Task.end_planned_date)
+    )
+    clear_counts = delete(TaskCount)
+    clear_due = delete(TaskDueCount)
+    if user_id is not None:
+        due = due.where(Task.user_id == user_id)
+        clear_counts = clear_counts.where(TaskCount.user_id == user_id)
+        clear_due = clear_due.where(TaskDueCount.user_id == user_id)
+
+    await connection.execute(clear_counts)
+    await connection.execute(clear_due)
+    await connection.execute(
+        insert(TaskCount).from_select(
+            ["user_id", "category_id", "state", "count"], counts
+        )
+    )
+    await connection.execute(
+        insert(TaskDueCount).from_select(["user_id", "end_planned_date", "count"], due)
+    )
+
+
+async def main(user_id: int | None):
+    async with async_engine.begin() as connection:
+        await rebuild_summary(connection, user_id)
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstruye los contadores de tareas")
+    parser.add_argument("--user", type=int, help="Solo reconstruye este usuario")
+    asyncio.run(main(parser.parse_args().user))
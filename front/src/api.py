@@ -0,0 +1,128 @@
+"""Cliente HTTP del backend compartido por todas las sesiones.
+
+``client`` mantiene un pool de conexiones keep-alive (y HTTP/2 si ``HTTP2`` es
+verdadero y está instalado ``h2``). Es asíncrono, así que las peticiones no
+bloquean el bucle de eventos de Flet mientras esperan al backend. Cada sesión usa
+``api(page)``, que agrega el token del usuario y vuelve al inicio de sesión
+cuando el backend responde 401.
+"""
+
+from contextlib import asynccontextmanager
+from functools import partialmethod
+
+import flet as ft
+import httpx
+
+from conf import (
+    BACK_URL,
+    EVENTS_READ_TIMEOUT,
+    HTTP2,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_TIMEOUT,
+)
+
+try:
+    import h2
+except ImportError:  # pragma: no cover
+    h2 = None
+
+client = httpx.AsyncClient(
+    base_url=BACK_URL,
+    http2=HTTP2 and h2 is not None,
+    timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+    limits=httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    ),
+)
+# Las conexiones de /tareas/eventos duran toda la sesión, por lo que van en un
+# pool aparte para no ocupar las del resto de las peticiones
+events_client = httpx.AsyncClient(
+    base_url=BACK_URL,
+    timeout=httpx.Timeout(HTTP_CONNECT_TIMEOUT, read=EVENTS_READ_TIMEOUT),
+    limits=httpx.Limits(max_connections=None, max_keepalive_connections=0),
+)
+
+
+def retry_after(r: httpx.Response | None, default: float) -> float:
+    """Segundos a esperar antes de reintentar según el encabezado ``Retry-After``
+    de ``r`` (con 429 y 503), o ``default`` si no lo trae"""
+    if r is not None and "Retry-After" in r.headers:
+        try:
+            return float(r.headers["Retry-After"])
+        except ValueError:
+            pass
+    return default
+
+
+class Api:
+    def __init__(self, page: ft.Page):
+        self.page = page
+        self._token = None
+
+    async def get_token(self) -> str | None:
+        if self._token is None and await self.page.client_storage.contains_key_async(
+            "token"
+        ):
+            self._token = (await self.page.client_storage.get_async("token"))[
+                "access_token"
+            ]
+        return self._token
+
+    async def login(self, token: dict, user: str):
+        await self.page.client_storage.set_async("token", token)
+        await self.page.client_storage.set_async("user", user)
+        self._token = token["access_token"]
+
+    async def logout(self):
+        if await self.get_token() is not None:
+            try:
+                await self.request("POST", "/usuarios/cerrar-sesion", redirect=False)
+            except httpx.HTTPError:
+                pass
+        self._token = None
+        await self.page.client_storage.clear_async()
+
+    async def _headers(self, headers: dict | None) -> dict:
+        headers = dict(headers or {})
+        token = await self.get_token()
+        if token is not None:
+            headers["Authorization"] = "Bearer " + token
+        # El backend usa la IP del navegador para sus límites por IP, ya que todas
+        # las sesiones le llegan desde este proceso (ver TRUSTED_PROXIES)
+        if self.page.client_ip:
+            headers["X-Forwarded-For"] = self.page.client_ip
+        return headers
+
+    async def request(
+        self, method: str, url: str, redirect: bool = True, **kwargs
+    ) -> httpx.Response:
+        """Envía la petición con el token de la sesión. Si el token fue rechazado y
+        ``redirect`` es verdadero, navega al inicio de sesión"""
+        headers = await self._headers(kwargs.pop("headers", None))
+        r = await client.request(method, url, headers=headers, **kwargs)
+        if r.status_code == 401 and "Authorization" in headers and redirect:
+            await self.page.go_async("/login")
+        return r
+
+    get = partialmethod(request, "GET")
+    post = partialmethod(request, "POST")
+    put = partialmethod(request, "PUT")
+    delete = partialmethod(request, "DELETE")
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs):
+        headers = await self._headers(kwargs.pop("headers", None))
+        async with events_client.stream(method, url, headers=headers, **kwargs) as r:
+            yield r
+
+
+def api(page: ft.Page) -> Api:
+    """Cliente de la sesión de ``page``, creado la primera vez que se usa"""
+    if not page.session.contains_key("api"):
+        page.session.set("api", Api(page))
+    return page.session.get("api")
@@ -1,16 +1,51 @@
+import asyncio
+
 import flet as ft
-import httpx
 
-from conf import BACK_URL
+from api import api
+from components import BackgroundControl
 from models import CategoryModel
 
 
-def get_categories(token) -> list[CategoryModel]:
-    r = httpx.get(
-        BACK_URL + "/categorias",
-        headers={"Authorization": "Bearer " + token},
-    )
-    return [CategoryModel.parse_obj(c) for c in r.json()]
+class CategoryStore:
+    """Categorías de una sesión, compartidas por todas sus vistas.
+
+    ``refresh`` las descarga la primera vez y luego las revalida con
+    ``If-None-Match``, de modo que si no cambiaron el backend responde 304 sin
+    cuerpo. Cuando cambian se avisa a las corrutinas suscritas con ``subscribe``.
+    """
+
+    def __init__(self, page: ft.Page):
+        self.page = page
+        self.categories: list[CategoryModel] = []
+        self.etag = None
+        self.listeners = []
+        self.lock = asyncio.Lock()
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    async def refresh(self) -> list[CategoryModel]:
+        async with self.lock:
+            headers = {"If-None-Match": self.etag} if self.etag else {}
+            r = await api(self.page).get("/categorias", headers=headers)
+            if r.status_code != 200:
+                return self.categories
+            self.categories = [CategoryModel.parse_obj(c) for c in r.json()]
+            self.etag = r.headers.get("ETag")
+        for listener in list(self.listeners):
+            await listener(self.categories)
+        return self.categories
+
+
+def category_store(page: ft.Page) -> CategoryStore:
+    if not page.session.contains_key("categories"):
+        page.session.set("categories", CategoryStore(page))
+    return page.session.get("categories")
 
 
 class Category(ft.UserControl):
@@ -20,18 +55,11 @@ class Category(ft.UserControl):
 
         self.category = category
 
-    def remove(self, event):
-        token = self.page.client_storage.get("token")["access_token"]
-        r = httpx.delete(
-            f"{BACK_URL}/categorias/{self.category.id}",
-            headers={"Authorization": "Bearer " + token},
-        )
-
-        if r.status_code == 401:
-            self.page.go("/login")
+    async def remove(self, event):
+        r = await api(self.page).delete(f"/categorias/{self.category.id}")
 
         if self.on_remove:
-            self.on_remove(self, error=r.status_code != 200)
+            await self.on_remove(self, error=r.status_code != 200)
 
     def build(self):
         self.name = ft.TextField(
@@ -66,32 +94,26 @@ class Category(ft.UserControl):
         )
 
 
-class CategoryList(ft.UserControl):
-    def add_category(self, event=None):
-        token = self.page.client_storage.get("token")["access_token"]
-        r = httpx.post(
-            f"{BACK_URL}/categorias",
+class CategoryList(BackgroundControl):
+    async def add_category(self, event=None):
+        r = await api(self.page).post(
+            "/categorias",
             json={
                 "name": self.name.value,
                 "description": self.description.value,
             },
-            headers={"Authorization": "Bearer " + token},
         )
 
-        if r.status_code == 401:
-            self.page.go("/login")
         if r.status_code != 200:
             raise RuntimeError()
 
-        category = CategoryModel.parse_obj(r.json())
-        self.list.controls.append(Category(category, on_remove=self.remove_category))
-        self.list.update()
+        await category_store(self.page).refresh()
 
-    def close_banner(self, event):
+    async def close_banner(self, event):
         self.banner.open = False
-        self.banner.update()
+        await self.banner.update_async()
 
-    def remove_category(self, control, error=False):
+    async def remove_category(self, control, error=False):
         if error:
 
             self.banner = ft.Banner(
@@ -110,10 +132,16 @@ class CategoryList(ft.UserControl):
             )
 
             self.result.controls.append(self.banner)
-            self.result.update()
+            await self.result.update_async()
         else:
-            self.list.controls.remove(control)
-            self.list.update()
+            await category_store(self.page).refresh()
+
+    async def show_categories(self, categories: list[CategoryModel]):
+        self.list.controls = [
+            Category(category, on_remove=self.remove_category)
+            for category in categories
+        ]
+        await self.list.update_async()
 
     def build(self):
         self.result = ft.Column()
@@ -156,11 +184,12 @@ class CategoryList(ft.UserControl):
             blur=10,
         )
 
-    def did_mount(self):
-        token = self.page.client_storage.get("token")["access_token"]
-        for category in get_categories(token):
-            self.list.controls.append(
-                Category(category, on_remove=self.remove_category)
-            )
+    async def did_mount_async(self):
+        store = category_store(self.page)
+        store.subscribe(self.show_categories)
+        await self.show_categories(store.categories)
+        self.run(store.refresh())
 
-        self.list.update()
+    async def will_unmount_async(self):
+        category_store(self.page).unsubscribe(self.show_categories)
+        await super().will_unmount_async()
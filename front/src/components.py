@@ -1,8 +1,41 @@
+import asyncio
 from datetime import date
 
 import flet as ft
 
 
+def navigate(route: str):
+    """Manejador de eventos que navega a ``route``"""
+
+    async def handler(event: ft.ControlEvent):
+        await event.page.go_async(route)
+
+    return handler
+
+
+class BackgroundControl(ft.UserControl):
+    """``UserControl`` cuyas tareas lanzadas con ``run`` se cancelan al desmontarlo,
+    de modo que las cargas en curso no sigan esperando al backend al salir de la
+    vista"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.background: set[asyncio.Task] = set()
+
+    def run(self, coroutine) -> asyncio.Task:
+        task = asyncio.create_task(coroutine)
+        self.background.add(task)
+        task.add_done_callback(self.background.discard)
+        return task
+
+    async def will_unmount_async(self):
+        # La tarea actual puede ser la que navegó fuera de la vista (por un 401)
+        current = asyncio.current_task()
+        for task in list(self.background):
+            if task is not current:
+                task.cancel()
+
+
 class DataPicker(ft.UserControl):
     def __init__(
         self, value=None, on_change=None, data=None, text_kwargs=None, **kwargs
@@ -13,22 +46,30 @@ class DataPicker(ft.UserControl):
         self.on_select = on_change
         self.value = value
 
+    def set_value(self, value: date):
+        self.value = value
+        self.picker.value = value
+        self.button.content.value = value.strftime("%Y-%m-%d")
+
     def build(self):
-        def on_change(event):
+        async def on_change(event):
             button.content.value = dp.value.date()
             self.value = dp.value.date()
-            button.update()
+            await button.update_async()
             if self.on_select:
-                self.on_select(event)
+                await self.on_select(event)
+
+        async def pick_date(event):
+            await dp.pick_date_async()
 
         if self.value is None:
             self.value = date.today()
 
-        dp = ft.DatePicker(on_change=on_change, data=self.data)
+        dp = self.picker = ft.DatePicker(on_change=on_change, data=self.data)
         dp.value = self.value
 
-        button = ft.TextButton(
+        button = self.button = ft.TextButton(
             content=ft.Text(self.value.strftime("%Y-%m-%d"), **self.text_kwargs),
-            on_click=lambda _: dp.pick_date(),
+            on_click=pick_date,
         )
         return ft.Row([button, dp])
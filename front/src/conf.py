@@ -1,3 +1,20 @@
 import os
 
 BACK_URL = os.environ.get("BACK_URL", "http://127.0.0.1:8080")
+EVENTS_READ_TIMEOUT = float(os.environ.get("EVENTS_READ_TIMEOUT", 60))
+EVENTS_RETRY_SECONDS = float(os.environ.get("EVENTS_RETRY_SECONDS", 3))
+
+HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", 10))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 5))
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(
+    os.environ.get("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20)
+)
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY", 30))
+HTTP2 = os.environ.get("HTTP2", "false").lower() in ("1", "true", "yes")
+
+WRITE_DEBOUNCE_SECONDS = float(os.environ.get("WRITE_DEBOUNCE_SECONDS", 0.8))
+WRITE_RETRY_SECONDS = float(os.environ.get("WRITE_RETRY_SECONDS", 3))
+
+TASK_PAGE_SIZE = int(os.environ.get("TASK_PAGE_SIZE", 50))
+TASK_WINDOW_SIZE = int(os.environ.get("TASK_WINDOW_SIZE", 40))
@@ -1,8 +1,8 @@
 import flet as ft
-import httpx
 from flet_core import ControlEvent
 
-from conf import BACK_URL
+from api import api
+from components import navigate
 
 
 class Register(ft.UserControl):
@@ -17,7 +17,7 @@ class Register(ft.UserControl):
             password=True,
             label="Contraseña",
             prefix_icon=ft.icons.LOCK_OUTLINE,
-            on_submit=lambda x: self.page.go("/register"),
+            on_submit=navigate("/register"),
             border=ft.InputBorder.UNDERLINE,
             can_reveal_password=True,
         )
@@ -38,7 +38,7 @@ class Register(ft.UserControl):
                             ft.FilledButton(
                                 icon=ft.icons.ARROW_LEFT,
                                 text="Volver",
-                                on_click=lambda x: self.page.go("/login"),
+                                on_click=navigate("/login"),
                             ),
                         ],
                         alignment=ft.MainAxisAlignment.CENTER,
@@ -47,12 +47,12 @@ class Register(ft.UserControl):
             ),
         )
 
-    def reset_color(self, event: ControlEvent):
+    async def reset_color(self, event: ControlEvent):
         if event.control.error_text:
             event.control.error_text = None
-            self.update()
+            await self.update_async()
 
-    def register(self, e):
+    async def register(self, e):
         ok = True
         self.username_input.error_text = ""
         self.password_input.error_text = ""
@@ -68,21 +68,21 @@ class Register(ft.UserControl):
             ok = False
 
         if not ok:
-            self.update()
+            await self.update_async()
             return
 
-        response = httpx.post(
-            BACK_URL + "/usuarios",
+        response = await api(self.page).post(
+            "/usuarios",
             json={
                 "username": self.username_input.value,
                 "password": self.password_input.value,
             },
         )
         if response.status_code == 200:
-            self.page.go("/login")
+            await self.page.go_async("/login")
         else:
             self.username_input.error_text = response.text
-            self.username_input.update()
+            await self.username_input.update_async()
 
 
 class Login(ft.UserControl):
@@ -123,7 +123,7 @@ class Login(ft.UserControl):
                             ),
                             ft.TextButton(
                                 text="Registrarse",
-                                on_click=lambda x: self.page.go("/register"),
+                                on_click=navigate("/register"),
                             ),
                         ],
                         alignment=ft.MainAxisAlignment.CENTER,
@@ -132,9 +132,9 @@ class Login(ft.UserControl):
             ),
         )
 
-    def login(self, e):
-        response = httpx.post(
-            BACK_URL + "/usuarios/iniciar-sesion",
+    async def login(self, e):
+        response = await api(self.page).post(
+            "/usuarios/iniciar-sesion",
             data={
                 "username": self.username_input.value,
                 "password": self.password_input.value,
@@ -145,9 +145,8 @@ class Login(ft.UserControl):
             self.password_input.error_text = (
                 "Nombre de usuario o contraseña incorrectos"
             )
-            self.update()
+            await self.update_async()
         else:
-            self.page.client_storage.set("token", response.json())
-            self.page.client_storage.set("user", self.username_input.value)
-            self.update()
-            self.on_login()
+            await api(self.page).login(response.json(), self.username_input.value)
+            await self.update_async()
+            await self.on_login()
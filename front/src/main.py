@@ -1,13 +1,18 @@
 import flet as ft
 from flet_core.types import AppView
 
+from api import api
 from categories import CategoryList
+from components import navigate
 from login import Login, Register
-from tasks import TaskList
+from tasks import TaskList, task_writer
 
 
-def main(page: ft.Page):
-    def route_change(route):
+async def main(page: ft.Page):
+    async def on_login():
+        await page.go_async("/tasks")
+
+    async def route_change(route):
         if page.route == "/register":
             page.views.append(
                 ft.View(
@@ -20,23 +25,25 @@ def main(page: ft.Page):
             return
 
         if (
-            not page.client_storage.contains_key("token")
+            not await page.client_storage.contains_key_async("token")
             or page.route == "/login"
             or page.route == "/logout"
         ):
+            await task_writer(page).close()
+            await api(page).logout()
             page.views.clear()
             page.route = "/login"
-            page.client_storage.clear()
             page.views.append(
                 ft.View(
                     "/login",
-                    [Login(on_login=lambda: page.go("/tasks"))],
+                    [Login(on_login=on_login)],
                     vertical_alignment=ft.MainAxisAlignment.CENTER,
                     horizontal_alignment=ft.CrossAxisAlignment.CENTER,
                 )
             )
             return
 
+        user = await page.client_storage.get_async("user")
         if page.route == "/categories":
             page.views.clear()
             page.views.append(
@@ -48,15 +55,13 @@ def main(page: ft.Page):
                                 [
                                     ft.IconButton(
                                         ft.icons.ARROW_LEFT,
-                                        on_click=lambda _: page.go("/tasks"),
+                                        on_click=navigate("/tasks"),
                                     ),
                                     ft.Text("Usuario: "),
-                                    ft.Text(
-                                        page.client_storage.get("user"), expand=True
-                                    ),
+                                    ft.Text(user, expand=True),
                                     ft.FilledButton(
                                         "Cerrar sesión",
-                                        on_click=lambda _: page.go("/login"),
+                                        on_click=navigate("/login"),
                                     ),
                                 ],
                                 alignment=ft.MainAxisAlignment.END,
@@ -76,16 +81,14 @@ def main(page: ft.Page):
                             title=ft.Row(
                                 [
                                     ft.Text("Usuario: "),
-                                    ft.Text(
-                                        page.client_storage.get("user"), expand=True
-                                    ),
+                                    ft.Text(user, expand=True),
                                     ft.TextButton(
                                         "Administrar categorías",
-                                        on_click=lambda _: page.go("/categories"),
+                                        on_click=navigate("/categories"),
                                     ),
                                     ft.FilledButton(
                                         "Cerrar sesión",
-                                        on_click=lambda _: page.go("/login"),
+                                        on_click=navigate("/login"),
                                     ),
                                 ],
                                 alignment=ft.MainAxisAlignment.END,
@@ -95,23 +98,23 @@ def main(page: ft.Page):
                     ],
                 )
             )
-        page.update()
+        await page.update_async()
 
-    def view_pop(*args, **kwargs):
+    async def view_pop(*args, **kwargs):
         page.views.pop()
         top_view = page.views[-1]
-        page.go(top_view.route)
+        await page.go_async(top_view.route)
 
     page.title = "Lista de tareas"
     page.vertical_alignment = ft.MainAxisAlignment.CENTER
     page.horizontal_alignment = ft.CrossAxisAlignment.CENTER
     page.on_route_change = route_change
     page.on_view_pop = view_pop
-    page.update()
-    if page.client_storage.contains_key("user"):
-        page.go("/tasks")
+    await page.update_async()
+    if await page.client_storage.contains_key_async("user"):
+        await page.go_async("/tasks")
     else:
-        page.go("/login")
+        await page.go_async("/login")
 
 
 if __name__ == "__main__":
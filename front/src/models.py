@@ -17,6 +17,7 @@ class TaskModel(BaseModel):
     state: State
     category_id: int
     user_id: int
+    version: int = 1
 
 
 class CategoryModel(BaseModel):
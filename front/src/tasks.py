@@ -1,43 +1,182 @@
+import asyncio
+from bisect import bisect_left
 from datetime import date, datetime
 
 import flet as ft
 import httpx
 
-from components import DataPicker
-from conf import BACK_URL
+from api import api, retry_after
+from components import BackgroundControl, DataPicker
+from conf import (
+    EVENTS_RETRY_SECONDS,
+    TASK_PAGE_SIZE,
+    TASK_WINDOW_SIZE,
+    WRITE_DEBOUNCE_SECONDS,
+    WRITE_RETRY_SECONDS,
+)
 from models import TaskModel, CategoryModel
-from categories import get_categories
+from categories import category_store
 
 STATUS = {"Sin iniciar": 1, "Iniciada": 2, "Finalizada": 3}
+# Alto fijo de cada fila, para que la lista pueda calcular el desplazamiento
+TASK_ROW_HEIGHT = 120
+
+
+class TaskWriter:
+    """Buffer de escritura de las ediciones de tareas de una sesión.
+
+    Los campos modificados de cada tarea se acumulan y se envían juntos en un solo
+    ``PUT`` cuando pasan ``WRITE_DEBOUNCE_SECONDS`` sin cambios o al llamar a
+    ``flush``. Si el envío falla por un error de red o del servidor, los campos
+    vuelven al buffer (sin pisar los editados mientras tanto) y se reintenta.
+
+    Si el backend rechaza los cambios (por ejemplo 404 o 422) la tarea vuelve a
+    los últimos valores guardados y se avisa a las corrutinas suscritas con
+    ``subscribe``, que reciben la tarea y el código de estado.
+    """
+
+    def __init__(self, page: ft.Page):
+        self.page = page
+        self.pending: dict[int, dict] = {}
+        self.tasks: dict[int, TaskModel] = {}
+        self.timers: dict[int, asyncio.Task] = {}
+        # Valores guardados en el backend de los campos editados de cada tarea
+        self.saved: dict[int, dict] = {}
+        self.listeners = []
+        # Los envíos de la sesión se serializan para que no lleguen desordenados
+        self.sending = asyncio.Lock()
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def has_pending(self, id: int) -> bool:
+        return id in self.pending
+
+    def change(self, task: TaskModel, field: str, value, previous):
+        """Agrega al buffer el nuevo ``value`` de ``field``; ``previous`` es el
+        valor que tenía la tarea antes de editarla"""
+        self.pending.setdefault(task.id, {})[field] = value
+        self.saved.setdefault(task.id, {}).setdefault(field, previous)
+        self.tasks[task.id] = task
+        self._schedule(task.id, WRITE_DEBOUNCE_SECONDS)
+
+    def _schedule(self, id: int, delay: float):
+        self._cancel(id)
+        self.timers[id] = asyncio.create_task(self._flush_later(id, delay))
+
+    def _cancel(self, id: int):
+        timer = self.timers.pop(id, None)
+        # El temporizador que está enviando ya no figura en ``timers``
+        if timer is not None and timer is not asyncio.current_task():
+            timer.cancel()
+
+    async def _flush_later(self, id: int, delay: float):
+        await asyncio.sleep(delay)
+        await self.flush(id)
+
+    def flush_soon(self):
+        """Adelanta el envío de todo lo pendiente sin esperar las respuestas"""
+        for id in list(self.pending):
+            self._schedule(id, 0)
+
+    async def flush(self, id: int, redirect: bool = True) -> bool:
+        """Envía los cambios pendientes de la tarea ``id``"""
+        async with self.sending:
+            self._cancel(id)
+            changes = self.pending.pop(id, None)
+            task = self.tasks.pop(id, None)
+            saved = self.saved.pop(id, {})
+            if not changes:
+                return True
+
+            try:
+                r = await api(self.page).put(
+                    f"/tareas/{id}", json=changes, redirect=redirect
+                )
+            except httpx.HTTPError:
+                r = None
+            if r is None or r.status_code >= 500 or r.status_code == 429:
+                delay = retry_after(r, WRITE_RETRY_SECONDS)
+                self.pending[id] = {**changes, **self.pending.get(id, {})}
+                self.tasks.setdefault(id, task)
+                self.saved[id] = {**self.saved.get(id, {}), **saved}
+                self._schedule(id, delay)
+                return False
+
+            if r.is_success:
+                if "ETag" in r.headers:
+                    task.version = int(r.headers["ETag"].strip('"'))
+                return True
+            if r.status_code == 401:
+                return False
+
+            # Los campos editados mientras tanto siguen pendientes, pero si también
+            # se rechazan deben volver al valor guardado y no al rechazado
+            edited = self.saved.get(id, {})
+            for field, value in saved.items():
+                if field in edited:
+                    edited[field] = value
+                else:
+                    setattr(task, field, value)
+
+        for listener in list(self.listeners):
+            await listener(task, r.status_code)
+        return False
+
+    def discard(self, id: int):
+        self._cancel(id)
+        self.pending.pop(id, None)
+        self.tasks.pop(id, None)
+        self.saved.pop(id, None)
+
+    async def flush_all(self, redirect: bool = True):
+        for id in list(self.pending):
+            await self.flush(id, redirect)
+
+    async def close(self):
+        """Envía lo pendiente una última vez y descarta lo que no se pudo enviar"""
+        await self.flush_all(redirect=False)
+        for id in list(self.timers):
+            self._cancel(id)
+        self.pending.clear()
+        self.tasks.clear()
+        self.saved.clear()
+
+
+def task_writer(page: ft.Page) -> TaskWriter:
+    if not page.session.contains_key("task_writer"):
+        page.session.set("task_writer", TaskWriter(page))
+    return page.session.get("task_writer")
 
 
 class Task(ft.UserControl):
-    categories: list[CategoryModel] = []
-
-    def __init__(self, task: TaskModel, on_remove=None):
+    def __init__(
+        self, task: TaskModel, categories: list[CategoryModel] = (), on_remove=None
+    ):
         super().__init__()
         self.on_remove = on_remove
         self.task = task
+        self.categories = categories
 
-    def on_change(self, event: ft.ControlEvent):
+    async def on_change(self, event: ft.ControlEvent):
+        previous = getattr(self.task, event.control.data)
         setattr(self.task, event.control.data, event.control.value)
-        token = self.page.client_storage.get("token")["access_token"]
 
         if type(event.control.value) is datetime:
             value = event.control.value.date().isoformat()
         else:
             value = event.control.value
-        r = httpx.put(
-            f"{BACK_URL}/tareas/{self.task.id}",
-            json={event.control.data: value},
-            headers={"Authorization": "Bearer " + token},
-        )
-
-        if r.status_code == 401:
-            self.page.go("/login")
+        task_writer(self.page).change(self.task, event.control.data, value, previous)
 
         if event.control.data == "state":
             self.change_status()
+        if event.control.data == "state" or self.text.error_text:
+            self.text.error_text = None
+            await self.update_async()
 
     def change_status(self):
         match int(self.task.state):
@@ -51,31 +190,48 @@ class Task(ft.UserControl):
                 self.icon.icon_color = ft.colors.GREEN
                 self.icon.icon = ft.icons.CHECK
         self.state.value = int(self.task.state)
-        if self.page is not None:
-            self.icon.update()
-            self.state.update()
 
-    def rotate_status(self, event=None):
+    def bind(self, task: TaskModel):
+        """Reutiliza la fila ya construida para mostrar ``task``"""
+        self.task = task
+        self.text.value = task.text
+        self.category.value = task.category_id
+        self.end_date.set_value(task.end_planned_date)
+        self.text.error_text = None
+        self.change_status()
+
+    def show_error(self, message: str):
+        self.text.error_text = message
+
+    def set_categories(self, categories: list[CategoryModel]):
+        self.categories = categories
+        self.category.options = self.category_options()
+
+    async def rotate_status(self, event=None):
         state = int(self.task.state) + 1
         if state > 3:
             state = 1
         self.task.state = state
         self.change_status()
+        await self.update_async()
 
-    def delete(self, event: ft.ControlEvent):
-        token = self.page.client_storage.get("token")["access_token"]
-        r = httpx.delete(
-            f"{BACK_URL}/tareas/{self.task.id}",
-            headers={"Authorization": "Bearer " + token},
-        )
+    def category_options(self) -> list[ft.dropdown.Option]:
+        return [
+            ft.dropdown.Option(category.id, category.name)
+            for category in self.categories
+        ]
 
-        if r.status_code == 401:
-            self.page.go("/login")
+    async def flush(self, event=None):
+        await task_writer(self.page).flush(self.task.id)
+
+    async def delete(self, event: ft.ControlEvent):
+        task_writer(self.page).discard(self.task.id)
+        r = await api(self.page).delete(f"/tareas/{self.task.id}")
 
         if r.status_code != 200:
             raise RuntimeError()
         if self.on_remove:
-            self.on_remove(self)
+            await self.on_remove(self)
 
     def build(self):
         result = ft.Column()
@@ -83,6 +239,7 @@ class Task(ft.UserControl):
             data="text",
             value=self.task.text,
             on_change=self.on_change,
+            on_blur=self.flush,
             border=ft.InputBorder.NONE,
             dense=True,
             content_padding=5,
@@ -92,10 +249,7 @@ class Task(ft.UserControl):
 
         self.category = ft.Dropdown(
             data="category_id",
-            options=[
-                ft.dropdown.Option(category.id, category.name)
-                for category in self.categories
-            ],
+            options=self.category_options(),
             on_change=self.on_change,
             expand=1,
             content_padding=5,
@@ -164,13 +318,13 @@ class TaskCreator(ft.UserControl):
         self.on_create = on_create
         self.categories = {}
 
-    def open(self, event=None):
+    async def open(self, event=None):
         self.dialog.open = True
-        self.dialog.update()
+        await self.dialog.update_async()
 
-    def close(self, event=None):
+    async def close(self, event=None):
         self.dialog.open = False
-        self.dialog.update()
+        await self.dialog.update_async()
 
     def on_dismiss(self, event=None):
         self.name.value = ""
@@ -178,10 +332,10 @@ class TaskCreator(ft.UserControl):
         self.category.value = self.category.options[0].key
         self.status.value = 1
 
-    def create_task(self, event=None):
+    async def create_task(self, event=None):
         if not self.name.value:
             self.name.error_text = "Debe incluir un nombre"
-            self.update()
+            await self.update_async()
             return
 
         data = {
@@ -191,24 +345,15 @@ class TaskCreator(ft.UserControl):
             "category_id": self.categories[self.category.value],
         }
 
-        r = httpx.post(
-            BACK_URL + "/tareas",
-            json=data,
-            headers={
-                "Authorization": "Bearer "
-                + self.page.client_storage.get("token")["access_token"]
-            },
-        )
-        if r.status_code == 401:
-            self.page.go("/login")
+        r = await api(self.page).post("/tareas", json=data)
 
         if r.status_code != 200:
             raise RuntimeError("Error")
 
         self.dialog.open = False
         self.on_dismiss()
-        self.dialog.update()
-        self.on_create(TaskModel.parse_obj(r.json()))
+        await self.dialog.update_async()
+        await self.on_create(TaskModel.parse_obj(r.json()))
 
     def build(self):
         self.name = ft.TextField(label="Tarea", on_submit=self.create_task)
@@ -242,32 +387,188 @@ class TaskCreator(ft.UserControl):
         )
         return self.dialog
 
-    def did_mount(self):
-        token = self.page.client_storage.get("token")["access_token"]
-        self.categories = {
-            category.name: category.id for category in get_categories(token)
-        }
-
+    async def show_categories(self, categories: list[CategoryModel]):
+        self.categories = {category.name: category.id for category in categories}
         self.category.options = [
             ft.dropdown.Option(category) for category in self.categories
         ]
+        if self.category.value not in self.categories:
+            self.category.value = next(iter(self.categories), None)
+        await self.update_async()
+
+    async def did_mount_async(self):
+        store = category_store(self.page)
+        store.subscribe(self.show_categories)
+        await self.show_categories(store.categories)
+
+    async def will_unmount_async(self):
+        category_store(self.page).unsubscribe(self.show_categories)
+
+
+class TaskList(BackgroundControl):
+    """Lista de tareas cargada por páginas a medida que se desplaza.
+
+    ``tasks`` contiene las tareas cargadas, ordenadas por id, pero solo se muestran
+    ``TASK_WINDOW_SIZE`` filas a partir de ``start``. Al acercarse a un borde la
+    ventana se corre y las filas que quedan fuera se reutilizan para las que
+    entran, por lo que la cantidad de controles no depende del número de tareas.
+
+    La carga inicial, las páginas y la escucha de cambios corren en segundo plano
+    y se cancelan al salir de la vista.
+    """
+
+    def __init__(self):
+        super().__init__(expand=True)
+        self.tasks: list[TaskModel] = []
+        self.ids: list[int] = []
+        self.start = 0
+        # Cursor de la siguiente página de /tareas y de /tareas/cambios
+        self.next_page = None
+        self.complete = False
+        self.cursor = None
+        self.lock = asyncio.Lock()
+        self.categories: list[CategoryModel] = []
+
+    def insert(self, task: TaskModel):
+        """Agrega o reemplaza una tarea cargada. Una tarea existente solo se
+        reemplaza si la versión recibida es más nueva y no tiene ediciones sin
+        enviar, para no pisar los cambios que se están editando en esta ventana"""
+        i = bisect_left(self.ids, task.id)
+        if i < len(self.ids) and self.ids[i] == task.id:
+            current = self.tasks[i]
+            if task.version > current.version and not task_writer(
+                self.page
+            ).has_pending(task.id):
+                self.tasks[i] = task
+            return
+        self.ids.insert(i, task.id)
+        self.tasks.insert(i, task)
+        if i < self.start:
+            self.start += 1
+
+    def remove(self, id: int):
+        i = bisect_left(self.ids, id)
+        if i < len(self.ids) and self.ids[i] == id:
+            del self.ids[i]
+            del self.tasks[i]
+            if i < self.start:
+                self.start -= 1
+
+    async def render(self):
+        """Muestra la ventana actual reutilizando las filas existentes"""
+        self.start = max(0, min(self.start, len(self.tasks) - TASK_WINDOW_SIZE))
+        window = self.tasks[self.start : self.start + TASK_WINDOW_SIZE]
+        ids = {task.id for task in window}
+        rows = {row.task.id: row for row in self.task_list.controls}
+        free = [row for id, row in rows.items() if id not in ids]
+        controls = []
+        for task in window:
+            row = rows.get(task.id)
+            if row is None and free:
+                row = free.pop()
+                row.bind(task)
+            elif row is None:
+                row = Task(task, self.categories, on_remove=self.remove_task)
+            elif row.task is not task:
+                row.bind(task)
+            controls.append(row)
+        self.task_list.controls = controls
+        await self.task_list.update_async()
+
+    async def load_page(self) -> bool:
+        params = {"limite": TASK_PAGE_SIZE}
+        if self.next_page is not None:
+            params["cursor"] = self.next_page
+        r = await api(self.page).get("/tareas", params=params)
+        if r.status_code != 200:
+            return False
+        if self.cursor is None:
+            self.cursor = r.headers["X-Change-Cursor"]
+        for data in r.json():
+            self.insert(TaskModel.parse_obj(data))
+        self.next_page = r.headers.get("X-Next-Cursor")
+        self.complete = self.next_page is None
+        return True
+
+    async def reload(self) -> bool:
+        self.tasks.clear()
+        self.ids.clear()
+        self.start = 0
+        self.next_page = None
+        self.complete = False
+        self.cursor = None
+        return await self.load_page()
+
+    async def on_scroll(self, event: ft.OnScrollEvent):
+        margin = TASK_ROW_HEIGHT * 3
+        if event.pixels >= event.max_scroll_extent - margin:
+            step = TASK_WINDOW_SIZE // 4
+        elif event.pixels <= margin and self.start > 0:
+            step = -(TASK_WINDOW_SIZE // 4)
+        else:
+            return
 
-        self.category.value = self.category.options[0].key
-        self.update()
-
-
-class TaskList(ft.UserControl):
-    def add_task(self, task: TaskModel):
-        self.task_list.controls.append(Task(task, on_remove=self.remove_task))
-        self.task_list.update()
-
-    def remove_task(self, control):
-        self.task_list.controls.remove(control)
-        self.task_list.update()
+        async with self.lock:
+            count = len(self.tasks)
+            end = self.start + TASK_WINDOW_SIZE + step
+            while len(self.tasks) < end and not self.complete:
+                if not await self.load_page():
+                    break
+            start = self.start
+            self.start = max(
+                0, min(self.start + step, len(self.tasks) - TASK_WINDOW_SIZE)
+            )
+            if self.start == start and len(self.tasks) == count:
+                return
+            await self.render()
+            shift = self.start - start
+        if shift:
+            # Compensa las filas que salieron de la ventana para no saltar
+            await self.task_list.scroll_to_async(
+                offset=event.pixels - shift * TASK_ROW_HEIGHT
+            )
+
+    async def show_categories(self, categories: list[CategoryModel]):
+        async with self.lock:
+            self.categories = categories
+            for row in self.task_list.controls:
+                row.set_categories(categories)
+            await self.task_list.update_async()
+
+    async def add_task(self, task: TaskModel):
+        async with self.lock:
+            self.insert(task)
+            self.start = len(self.tasks)
+            await self.render()
+        await self.task_list.scroll_to_async(offset=-1)
+
+    async def remove_task(self, control):
+        async with self.lock:
+            self.remove(control.task.id)
+            await self.render()
+
+    async def on_write_rejected(self, task: TaskModel, status_code: int):
+        """Muestra en la fila que no se guardaron los cambios de ``task``, que ya
+        volvió a los valores guardados; si la tarea ya no existe se quita"""
+        async with self.lock:
+            if status_code == 404:
+                self.remove(task.id)
+                await self.render()
+                return
+            for row in self.task_list.controls:
+                if row.task.id == task.id:
+                    row.bind(row.task)
+                    row.show_error("No se pudieron guardar los cambios")
+            await self.task_list.update_async()
 
     def build(self):
-        self.result = ft.Column()
-        self.task_list = ft.ListView()
+        self.result = ft.Column(expand=True)
+        self.task_list = ft.ListView(
+            expand=True,
+            item_extent=TASK_ROW_HEIGHT,
+            on_scroll=self.on_scroll,
+            on_scroll_interval=100,
+        )
 
         self.task_creator = TaskCreator(on_create=self.add_task)
         self.result.controls.append(self.task_creator)
@@ -280,23 +581,101 @@ class TaskList(ft.UserControl):
             padding=10,
             margin=50,
             blur=10,
+            expand=True,
         )
 
-    def did_mount(self):
-        token = self.page.client_storage.get("token")["access_token"]
-        r = httpx.get(
-            f"{BACK_URL}/tareas",
-            headers={"Authorization": "Bearer " + token},
+    def apply_changes(self, changes: dict):
+        """Aplica una respuesta de ``/tareas/cambios`` a las tareas cargadas. Las
+        tareas nuevas posteriores a la última página cargada se omiten, porque
+        llegarán con las páginas siguientes"""
+        for id in changes["deleted"]:
+            self.remove(id)
+        for data in changes["tasks"]:
+            task = TaskModel.parse_obj(data)
+            if self.complete or (self.ids and task.id <= self.ids[-1]):
+                self.insert(task)
+
+    async def sync(self) -> bool:
+        """Descarga los cambios desde el último cursor y actualiza la lista.
+
+        Devuelve falso si la sesión ya no es válida. Si el backend no puede
+        responder (429, 503, 500) lanza ``httpx.HTTPStatusError``.
+        """
+        async with self.lock:
+            while True:
+                r = await api(self.page).get(
+                    "/tareas/cambios", params={"limite": 500, "desde": self.cursor}
+                )
+
+                if r.status_code == 401:
+                    return False
+
+                if r.status_code == 400:
+                    # El cursor no es válido: se vuelve a cargar desde el principio
+                    if not await self.reload():
+                        return False
+                    break
+
+                r.raise_for_status()
+                changes = r.json()
+                self.apply_changes(changes)
+                self.cursor = changes["cursor"]
+                if not changes["more"]:
+                    break
+            await self.render()
+        return True
+
+    async def resync(self) -> bool:
+        """Sincroniza esperando y reintentando mientras el backend no pueda responder"""
+        while True:
+            try:
+                return await self.sync()
+            except httpx.HTTPStatusError as e:
+                await asyncio.sleep(retry_after(e.response, EVENTS_RETRY_SECONDS))
+            except httpx.HTTPError:
+                await asyncio.sleep(EVENTS_RETRY_SECONDS)
+
+    async def listen(self):
+        """Sincroniza la lista cada vez que el backend avisa un cambio de las tareas"""
+        while True:
+            delay = 0
+            try:
+                async with api(self.page).stream("GET", "/tareas/eventos") as r:
+                    if r.status_code == 401:
+                        return
+                    if r.status_code != 200:
+                        delay = retry_after(r, EVENTS_RETRY_SECONDS)
+                    else:
+                        async for line in r.aiter_lines():
+                            if line.startswith("data:") and not await self.resync():
+                                return
+            except httpx.HTTPError:
+                delay = EVENTS_RETRY_SECONDS
+            await asyncio.sleep(delay)
+            # Al reconectarse se recuperan los cambios perdidos mientras tanto
+            if not await self.resync():
+                return
+
+    async def load(self):
+        """Carga las categorías y la primera página de tareas a la vez y luego
+        escucha los cambios"""
+        categories, loaded = await asyncio.gather(
+            category_store(self.page).refresh(), self.load_page()
         )
-
-        if r.status_code == 401:
-            self.page.go("/login")
-
-        tasks = r.json()
-
-        Task.categories = get_categories(token)
-        for task in tasks:
-            task = TaskModel.parse_obj(task)
-            self.task_list.controls.append(Task(task, on_remove=self.remove_task))
-
-        self.task_list.update()
+        if not loaded:
+            return
+        async with self.lock:
+            self.categories = categories
+            await self.render()
+        await self.listen()
+
+    async def did_mount_async(self):
+        category_store(self.page).subscribe(self.show_categories)
+        task_writer(self.page).subscribe(self.on_write_rejected)
+        self.run(self.load())
+
+    async def will_unmount_async(self):
+        category_store(self.page).unsubscribe(self.show_categories)
+        task_writer(self.page).unsubscribe(self.on_write_rejected)
+        task_writer(self.page).flush_soon()
+        await super().will_unmount_async()